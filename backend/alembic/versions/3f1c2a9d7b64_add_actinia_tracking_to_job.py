@@ -0,0 +1,40 @@
+"""add actinia resource tracking to job
+
+Revision ID: 3f1c2a9d7b64
+Revises: 888e7cdd73a6
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b64'
+down_revision: Union[str, None] = '888e7cdd73a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.add_column(sa.Column("resource_url", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("message", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("progress", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("next_poll_at", sa.DateTime(), nullable=True))
+        batch_op.create_index("ix_job_next_poll_at", ["next_poll_at"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_index("ix_job_next_poll_at")
+        batch_op.drop_column("next_poll_at")
+        batch_op.drop_column("updated_at")
+        batch_op.drop_column("created_at")
+        batch_op.drop_column("progress")
+        batch_op.drop_column("message")
+        batch_op.drop_column("resource_url")
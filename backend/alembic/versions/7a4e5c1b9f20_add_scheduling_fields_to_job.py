@@ -0,0 +1,36 @@
+"""add scheduling fields to job
+
+Revision ID: 7a4e5c1b9f20
+Revises: 3f1c2a9d7b64
+Create Date: 2026-10-18 11:02:17.402935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4e5c1b9f20'
+down_revision: Union[str, None] = '3f1c2a9d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.add_column(sa.Column("job_type", sa.String(), nullable=False, server_default="generic"))
+        batch_op.add_column(sa.Column("priority", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("queued_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("started_at", sa.DateTime(), nullable=True))
+        batch_op.create_index("ix_job_job_type", ["job_type"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_index("ix_job_job_type")
+        batch_op.drop_column("started_at")
+        batch_op.drop_column("queued_at")
+        batch_op.drop_column("priority")
+        batch_op.drop_column("job_type")
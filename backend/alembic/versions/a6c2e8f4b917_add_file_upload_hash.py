@@ -0,0 +1,34 @@
+"""add file upload hash
+
+Revision ID: a6c2e8f4b917
+Revises: f3b9d1c7e845
+Create Date: 2026-10-18 19:47:31.552804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e8f4b917'
+down_revision: Union[str, None] = 'f3b9d1c7e845'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.add_column(sa.Column("upload_hash", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("upload_format", sa.String(), nullable=True))
+        batch_op.create_index("ix_file_upload_hash", ["upload_hash"])
+    # content_hash was never updated on conversion, so it is the hash of the upload
+    op.execute("UPDATE file SET upload_hash = content_hash, upload_format = format")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.drop_index("ix_file_upload_hash")
+        batch_op.drop_column("upload_format")
+        batch_op.drop_column("upload_hash")
@@ -0,0 +1,42 @@
+"""add job hash and file content hash
+
+Revision ID: b2d8e6f4a113
+Revises: 7a4e5c1b9f20
+Create Date: 2026-10-18 11:47:53.290114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d8e6f4a113'
+down_revision: Union[str, None] = '7a4e5c1b9f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(), nullable=True))
+        batch_op.create_index("ix_file_content_hash", ["content_hash"])
+
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.add_column(sa.Column("job_hash", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("joined_job_id", sa.Integer(), nullable=True))
+        batch_op.create_index("ix_job_job_hash", ["job_hash"])
+        batch_op.create_index("ix_job_joined_job_id", ["joined_job_id"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_index("ix_job_joined_job_id")
+        batch_op.drop_index("ix_job_job_hash")
+        batch_op.drop_column("joined_job_id")
+        batch_op.drop_column("job_hash")
+
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.drop_index("ix_file_content_hash")
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,28 @@
+"""add file storage path
+
+Revision ID: d4a7c2e9b351
+Revises: b2d8e6f4a113
+Create Date: 2026-10-18 15:02:11.648203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c2e9b351'
+down_revision: Union[str, None] = 'b2d8e6f4a113'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.add_column(sa.Column("storage_path", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.drop_column("storage_path")
@@ -0,0 +1,44 @@
+"""add file raster metadata
+
+Revision ID: e1f5b8a3c672
+Revises: d4a7c2e9b351
+Create Date: 2026-10-18 15:40:27.915530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f5b8a3c672'
+down_revision: Union[str, None] = 'd4a7c2e9b351'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        batch_op.add_column(sa.Column("is_cog", sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column("min_x", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("min_y", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("max_x", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("max_y", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("resolution_x", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("resolution_y", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("width", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("height", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("data_type", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("nodata", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("band_stats", postgresql.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("file") as batch_op:
+        for column in (
+            "band_stats", "nodata", "data_type", "height", "width", "resolution_y", "resolution_x",
+            "max_y", "max_x", "min_y", "min_x", "is_cog",
+        ):
+            batch_op.drop_column(column)
@@ -0,0 +1,29 @@
+"""add job payload
+
+Revision ID: f3b9d1c7e845
+Revises: e1f5b8a3c672
+Create Date: 2026-10-18 18:12:05.301447
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d1c7e845'
+down_revision: Union[str, None] = 'e1f5b8a3c672'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.add_column(sa.Column("payload", postgresql.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_column("payload")
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, status, Form, Depends
+from fastapi.concurrency import run_in_threadpool
 from app.services.actinia.validation import validate_actinia_user
 from app.services.auth.jwt import create_access_token, refresh_token, verify_token
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -41,24 +42,16 @@ def get_user_profile(
     }
 
 
-@router.post("/login")
-def login(
-    request: Request,
-    username: str = Form(...),
-    password: str = Form(...),
-    db: Session = Depends(get_db)
-):
-    # Step 1: Validate credentials
-    if not validate_actinia_user(username, password):
-        raise HTTPException(status_code=401, detail="Invalid Actinia credentials")
-
-    # Step 2: Find user (before creating token!)
+def _open_session(db: Session, username: str, ip: str, user_agent: str) -> str:
+    """
+    Token of a new session of username; the blocking database half of /login.
+    """
+    # Find user (before creating token!)
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Step 3: Generate token using user's actual role and groups
-    # Inside your /login route
+    # Generate token using user's actual role and groups
     token = create_access_token({
         "sub": username,
         "user_id": user.id,
@@ -67,13 +60,7 @@ def login(
         "groups": user.groups or []
     })
 
-
-
-    # Step 4: Extract metadata
-    ip = request.client.host
-    user_agent = request.headers.get("user-agent", "unknown")
-
-    # Step 5: Store session
+    # Store session
     session = SessionModel(
         user_id=user.id,
         session_token=token,
@@ -84,6 +71,26 @@ def login(
     )
     db.add(session)
     db.commit()
+    return token
+
+
+@router.post("/login")
+async def login(
+    request: Request,
+    username: str = Form(...),
+    password: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    # Step 1: Validate credentials
+    if not await validate_actinia_user(username, password):
+        raise HTTPException(status_code=401, detail="Invalid Actinia credentials")
+
+    # Step 2: Extract metadata
+    ip = request.client.host
+    user_agent = request.headers.get("user-agent", "unknown")
+
+    # Step 3: Find the user and store the session, off the event loop
+    token = await run_in_threadpool(_open_session, db, username, ip, user_agent)
 
     return {"access_token": token, "token_type": "bearer"}
 
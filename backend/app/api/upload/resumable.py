@@ -0,0 +1,292 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, Security
+from pydantic import BaseModel, Field
+from sqlmodel import Session
+
+from app.api.upload.routes import USERDATA_DIR, check_filename, store_upload
+from app.config import settings
+from app.database import get_db
+from app.services.actinia.buffer_cache import hash_file
+from app.services.auth.jwt import verify_token
+
+router = APIRouter()
+
+# Uploads in progress, next to the user directories so finalizing is a rename
+RESUMABLE_DIR = USERDATA_DIR / "tmp" / "resumable"
+# Suggested PATCH size; clients may send any size
+RESUMABLE_CHUNK_SIZE = 64 * 1024 * 1024
+# Unfinished uploads untouched for this long are removed
+RESUMABLE_UPLOAD_TTL = 24 * 3600
+META = "meta.json"
+# meta.json is renamed to this while a finalize request owns the upload
+FINALIZING = "finalizing.json"
+PARTS = "parts"
+# One marker file per PATCH writing into the upload; finalize waits for none
+WRITERS = "writers"
+# Markers older than this are left over by a crashed process
+WRITER_TIMEOUT = 3600
+
+
+class ResumableCreate(BaseModel):
+    filename: str
+    size: int = Field(ge=0)
+
+
+def _upload_dir(upload_id: str) -> Path:
+    try:
+        return RESUMABLE_DIR / UUID(upload_id).hex
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+
+def _load_upload(upload_id: str, user: dict) -> tuple[Path, dict]:
+    """
+    Directory and metadata of one of the user's uploads; 404 for anybody else's.
+    """
+    if not user or not user.get("user_id"):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    upload_dir = _upload_dir(upload_id)
+    try:
+        meta = json.loads((upload_dir / META).read_text())
+    except FileNotFoundError:
+        if (upload_dir / FINALIZING).exists():
+            raise HTTPException(status_code=409, detail="Upload is being finalized")
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if meta["user_id"] != user["user_id"]:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload_dir, meta
+
+
+def received_ranges(upload_dir: Path) -> list[tuple[int, int]]:
+    """
+    Merged [start, end) byte ranges written so far.
+
+    Every PATCH records the range it wrote as an empty parts/<start>-<end>
+    file, so concurrent PATCHes of one upload need no lock.
+    """
+    ranges = sorted(
+        tuple(int(bound) for bound in part.name.split("-"))
+        for part in (upload_dir / PARTS).iterdir()
+    )
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _status(upload_id: str, upload_dir: Path, meta: dict) -> dict:
+    ranges = received_ranges(upload_dir)
+    return {
+        "upload_id": upload_id,
+        "filename": meta["filename"],
+        "size": meta["size"],
+        # bytes received from the start without a gap: where a sequential client resumes
+        "offset": ranges[0][1] if ranges and ranges[0][0] == 0 else 0,
+        "received": [list(r) for r in ranges],
+        "complete": meta["size"] == 0 or ranges == [(0, meta["size"])],
+    }
+
+
+def _add_writer(upload_id: str) -> Path:
+    """
+    Mark a PATCH as writing into the upload, before its metadata is checked (see finalize_upload).
+    """
+    writers = _upload_dir(upload_id) / WRITERS
+    try:
+        writers.mkdir(exist_ok=True)
+        marker = writers / uuid4().hex
+        marker.touch()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return marker
+
+
+def _active_writers(upload_dir: Path) -> int:
+    writers = upload_dir / WRITERS
+    if not writers.exists():
+        return 0
+    cutoff = time.time() - WRITER_TIMEOUT
+    return sum(1 for marker in writers.iterdir() if marker.stat().st_mtime >= cutoff)
+
+
+def _remove_expired():
+    if not RESUMABLE_DIR.exists():
+        return
+    cutoff = time.time() - RESUMABLE_UPLOAD_TTL
+    for upload_dir in RESUMABLE_DIR.iterdir():
+        # the parts directory changes with every PATCH
+        parts = upload_dir / PARTS
+        try:
+            expired = (parts if parts.exists() else upload_dir).stat().st_mtime < cutoff
+        except FileNotFoundError:
+            continue
+        if expired:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def _create(meta: dict) -> Path:
+    _remove_expired()
+    upload_dir = RESUMABLE_DIR / meta["upload_id"]
+    (upload_dir / PARTS).mkdir(parents=True)
+    (upload_dir / WRITERS).mkdir()
+    try:
+        # allocated up front so chunks can be written at any offset, in any order
+        with open(upload_dir / meta["filename"], "wb") as f:
+            f.truncate(meta["size"])
+        (upload_dir / META).write_text(json.dumps(meta))
+    except OSError:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    return upload_dir
+
+
+@router.post("/resumable")
+async def create_upload(
+    request: ResumableCreate,
+    user: dict = Security(verify_token)
+):
+    """
+    Start a resumable upload; the file is then sent with PATCH requests and registered by finalize.
+    """
+    if not user or not user.get("user_id") or not user.get("username"):
+        raise HTTPException(status_code=400, detail="Missing user_id or username in token")
+    filename, _ = check_filename(request.filename)
+    if request.size > settings.RESUMABLE_MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Uploads are limited to {settings.RESUMABLE_MAX_UPLOAD_SIZE} bytes"
+        )
+
+    meta = {
+        "upload_id": uuid4().hex,
+        "user_id": user["user_id"],
+        "username": user["username"],
+        "filename": filename,
+        "size": request.size,
+        "created_at": time.time(),
+    }
+    try:
+        await asyncio.to_thread(_create, meta)
+    except OSError as e:
+        print(f"[Upload] could not allocate {request.size} bytes for {filename}: {e!r}")
+        raise HTTPException(status_code=507, detail="Not enough storage for the upload")
+    return {
+        "upload_id": meta["upload_id"],
+        "filename": filename,
+        "size": request.size,
+        "offset": 0,
+        "chunk_size": RESUMABLE_CHUNK_SIZE,
+    }
+
+
+@router.patch("/resumable/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+    user: dict = Security(verify_token)
+):
+    """
+    Write the request body at the byte offset of the Upload-Offset header.
+
+    Chunks may be sent in any order and in parallel. A chunk cut off by a
+    network drop keeps what was received; GET the upload to see what is missing.
+    """
+    # marked before meta.json is read: finalize either sees the marker or this PATCH sees no meta.json
+    marker = await asyncio.to_thread(_add_writer, upload_id)
+    try:
+        upload_dir, meta = await asyncio.to_thread(_load_upload, upload_id, user)
+        if "content-length" in request.headers and upload_offset + int(request.headers["content-length"]) > meta["size"]:
+            raise HTTPException(status_code=400, detail="Chunk goes past the end of the upload")
+
+        position = upload_offset
+        fd = await asyncio.to_thread(os.open, upload_dir / meta["filename"], os.O_WRONLY)
+        try:
+            async for chunk in request.stream():
+                if position + len(chunk) > meta["size"]:
+                    raise HTTPException(status_code=400, detail="Chunk goes past the end of the upload")
+                await asyncio.to_thread(os.pwrite, fd, chunk, position)
+                position += len(chunk)
+        finally:
+            await asyncio.to_thread(os.close, fd)
+            if position > upload_offset:
+                await asyncio.to_thread((upload_dir / PARTS / f"{upload_offset}-{position}").touch)
+    finally:
+        await asyncio.to_thread(marker.unlink, True)
+
+    status = await asyncio.to_thread(_status, upload_id, upload_dir, meta)
+    response.headers["Upload-Offset"] = str(status["offset"])
+    return status
+
+
+@router.get("/resumable/{upload_id}")
+async def upload_status(
+    upload_id: str,
+    response: Response,
+    user: dict = Security(verify_token)
+):
+    upload_dir, meta = await asyncio.to_thread(_load_upload, upload_id, user)
+    status = await asyncio.to_thread(_status, upload_id, upload_dir, meta)
+    response.headers["Upload-Offset"] = str(status["offset"])
+    return status
+
+
+@router.post("/resumable/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    user: dict = Security(verify_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Register a complete upload like /upload/upload does: EPSG detection, location/mapset and File record.
+    """
+    upload_dir, meta = await asyncio.to_thread(_load_upload, upload_id, user)
+    status = await asyncio.to_thread(_status, upload_id, upload_dir, meta)
+    if not status["complete"]:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "received": status["received"]})
+
+    # claim the upload: of concurrent finalize requests, only one renames meta.json
+    try:
+        await asyncio.to_thread(os.rename, upload_dir / META, upload_dir / FINALIZING)
+    except FileNotFoundError:
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    # PATCHes that started before the claim may still be writing
+    if await asyncio.to_thread(_active_writers, upload_dir):
+        await asyncio.to_thread(os.rename, upload_dir / FINALIZING, upload_dir / META)
+        raise HTTPException(status_code=409, detail="Chunks are still being written")
+
+    data_path = upload_dir / meta["filename"]
+    try:
+        content_hash = (await asyncio.to_thread(hash_file, data_path)).hexdigest()
+        result = await store_upload(db, meta["user_id"], meta["username"], data_path, content_hash, background_tasks)
+    except BaseException:
+        if data_path.exists():
+            # on failure the upload stays, to finalize again or delete
+            await asyncio.to_thread(os.rename, upload_dir / FINALIZING, upload_dir / META)
+        else:
+            # the file was already moved away: nothing left to finalize
+            await asyncio.to_thread(shutil.rmtree, upload_dir, True)
+        raise
+    await asyncio.to_thread(shutil.rmtree, upload_dir, True)
+    return result
+
+
+@router.delete("/resumable/{upload_id}")
+async def delete_upload(
+    upload_id: str,
+    user: dict = Security(verify_token)
+):
+    upload_dir, _ = await asyncio.to_thread(_load_upload, upload_id, user)
+    await asyncio.to_thread(shutil.rmtree, upload_dir, True)
+    return {"message": "Upload deleted", "upload_id": upload_id}
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
 from sqlmodel import Session
 from app.models.session import Session as SessionModel
 from sqlmodel import select
+import asyncio
+import hashlib
+import os
 import shutil
+import tempfile
 import time
 from pathlib import Path
-import zipfile
 from uuid import uuid4
 from fastapi import Security
 
@@ -14,67 +17,135 @@ from app.services.auth.jwt import verify_token
 from app.database import get_db
 from app.models.file import File as FileModel
 
-from app.utils.geospatial import get_epsg_from_raster, get_epsg_from_vector, create_location_and_mapset
+from app.services.upload_processing import copy_raster_metadata, process_raster_upload
+from app.utils.geospatial import create_location_and_mapset, probe_upload
 
 router = APIRouter()
 
 SUPPORTED_EXT = ["tif", "tiff", "asc", "geojson", "shp", "zip", "gpkg"]
+# Bytes read from the upload and written to disk at a time
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-@router.post("/upload")
-async def upload_file(
-    file: UploadFile = File(...),
-    user: dict = Security(verify_token),
-    db: Session = Depends(get_db)
-):
+USERDATA_DIR = Path(__file__).resolve().parents[3] / "data" / "actinia-data" / "userdata"
 
-    user_id = user.get("user_id")
-    username = user.get("username")
-    if not user_id or not username:
-        raise HTTPException(status_code=400, detail="Missing user_id or username in token")
 
+def _request_temp_dir() -> Path:
+    """
+    A temp directory of its own for one upload, next to the user directories so
+    moving the file into place is a rename.
+    """
+    temp_root = USERDATA_DIR / "tmp"
+    temp_root.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix="upload_", dir=temp_root))
 
-    # File validation
-    filename = file.filename
+
+async def _save_upload(file: UploadFile, path: Path) -> str:
+    """
+    Copy the upload to path chunk by chunk, off the event loop; returns the sha256 of the content.
+    """
+    digest = hashlib.sha256()
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    finally:
+        await asyncio.to_thread(out.close)
+    return digest.hexdigest()
+
+
+def check_filename(filename: str) -> tuple[str, str]:
+    """
+    Base name and lower-case extension of an uploaded file name; 400 for unsupported formats.
+    """
+    filename = Path(filename).name
     ext = filename.split(".")[-1].lower()
     if ext not in SUPPORTED_EXT:
         raise HTTPException(status_code=400, detail=f"Unsupported file format: .{ext}")
+    return filename, ext
+
+
+def _stored_copy(db: Session, content_hash: str, ext: str) -> FileModel | None:
+    """
+    The latest valid upload of this content and format whose file is still on disk.
+
+    Matched on what was uploaded: the stored file may since have been converted (see upload_processing.py).
+    """
+    candidates = (
+        db.query(FileModel)
+        .filter(
+            FileModel.upload_hash == content_hash,
+            FileModel.upload_format == ext,
+            FileModel.valid.is_(True),
+            FileModel.storage_path.is_not(None),
+        )
+        .order_by(FileModel.id.desc())
+        .all()
+    )
+    return next((record for record in candidates if os.path.isfile(record.storage_path)), None)
 
-    # Save temp file
-    base_dir = Path(__file__).resolve().parents[3]
-    temp_dir = base_dir / "data" / "actinia-data" / "userdata" / "tmp"
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    temp_path = temp_dir / filename
 
-    if temp_path.exists():
-        raise HTTPException(status_code=400, detail="File already exists")
+def _link_blob(source: Path, target: Path) -> bool:
+    """
+    Hard link target to an existing copy; False when the filesystem refuses.
+    """
+    if target.exists():
+        if os.path.samefile(source, target):
+            return True
+        target.unlink()
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        return False
 
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    time.sleep(1)
 
-    # Detect EPSG
-    epsg = None
-    vector_path = temp_path
-    if ext == "zip":
+def _save_file_record(db: Session, file_record: FileModel) -> FileModel:
+    """
+    Store the File record of an upload, tied to the user's session; the blocking half of store_upload.
+    """
+    latest_session = (
+        db.query(SessionModel)
+        .filter(SessionModel.user_id == file_record.user_id)
+        .first()
+    )
+    file_record.session_id = latest_session.id if latest_session else None
+    db.add(file_record)
+    db.commit()
+    db.refresh(file_record)
+    return file_record
+
+
+async def store_upload(
+    db: Session,
+    user_id: int,
+    username: str,
+    temp_path: Path,
+    content_hash: str,
+    background_tasks: BackgroundTasks | None = None
+) -> dict:
+    """
+    Register a completely received upload: detect its EPSG, provision its GRASS
+    location/mapset, move it into the user's directory and create its File record.
+
+    Content uploaded before is not probed again: the stored copy's EPSG is
+    reused and the new file is a hard link to it. temp_path must be on the same
+    filesystem as USERDATA_DIR (see _request_temp_dir); the caller removes it.
+    Rasters then go through process_raster_upload in background_tasks, unless
+    the stored copy's metadata can be reused. Returns the upload response.
+    """
+    filename, ext = check_filename(temp_path.name)
+
+    stored = await asyncio.to_thread(_stored_copy, db, content_hash, ext)
+    if stored is not None:
+        epsg = stored.epsg
+    else:
+        # Detect EPSG from the headers; a ZIP is read in place
         try:
-            with zipfile.ZipFile(temp_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-                for name in zip_ref.namelist():
-                    if name.endswith(".shp"):
-                        vector_path = temp_dir / name
-                        break
-                else:
-                    raise HTTPException(status_code=400, detail="No .shp file found in ZIP archive")
-        except zipfile.BadZipFile:
-            raise HTTPException(status_code=400, detail="Uploaded ZIP is not a valid archive")
-
-    try:
-        if ext in ["tif", "tiff", "asc"]:
-            epsg = get_epsg_from_raster(str(temp_path))
-        elif ext in ["geojson", "gpkg", "shp", "zip"]:
-            epsg = get_epsg_from_vector(str(vector_path))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"GDAL/OGR validation failed: {e}")
+            metadata = await probe_upload(temp_path, ext)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"GDAL/OGR validation failed: {e}")
+        epsg = metadata["epsg"]
 
     # Create GRASS location/mapset
     location = f"location_epsg_{epsg}"
@@ -82,46 +153,84 @@ async def upload_file(
     mapset = f"mapset_{username}_{timestamp}"
     try:
         if epsg:
-            create_location_and_mapset(location, mapset, epsg)
+            await create_location_and_mapset(location, mapset, epsg)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Actinia error: {str(e)}")
 
     # Final upload path includes username  no superadmin fallback)
-    upload_dir = base_dir / "data" / "actinia-data" / "userdata" / username / location / mapset
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    final_path = upload_dir / filename
-    shutil.move(str(temp_path), final_path)
-
-    # Session fetch
-    latest_session = (
-        db.query(SessionModel)
-        .filter(SessionModel.user_id == user_id)
-        .first()
-    )
+    upload_dir = USERDATA_DIR / username / location / mapset
+    await asyncio.to_thread(upload_dir.mkdir, parents=True, exist_ok=True)
+
+    # a link to the stored copy, or a rename: the temp directory is on the same filesystem
+    linked = False
+    if stored is not None:
+        # the stored copy may have been converted, e.g. from .asc to a .tif COG
+        stored_name = f"{Path(filename).stem}{Path(stored.storage_path).suffix}"
+        linked = await asyncio.to_thread(_link_blob, Path(stored.storage_path), upload_dir / stored_name)
+    if linked:
+        final_path = upload_dir / stored_name
+    else:
+        final_path = upload_dir / filename
+        await asyncio.to_thread(shutil.move, str(temp_path), final_path)
 
     # Save file metadata to DB
     file_type = "raster" if ext in ["tif", "tiff", "asc"] else "vector"
     file_record = FileModel(
         user_id=user_id,
-        file_name=file.filename,
+        file_name=final_path.name,
         file_type=file_type,
-        format=ext,
+        format=stored.format if linked else ext,
         epsg=epsg,
         valid=True,
+        content_hash=stored.content_hash if linked else content_hash,
+        upload_hash=content_hash,
+        upload_format=ext,
+        storage_path=str(final_path),
         location=location,
         mapset=mapset,
-        session_id=latest_session.id if latest_session else None
     )
-    db.add(file_record)
-    db.commit()
-    db.refresh(file_record)
+    reuse_metadata = file_type == "raster" and linked and stored.data_type is not None
+    if reuse_metadata:
+        copy_raster_metadata(stored, file_record)
+    file_record = await asyncio.to_thread(_save_file_record, db, file_record)
+
+    if file_type == "raster" and not reuse_metadata and background_tasks is not None:
+        background_tasks.add_task(process_raster_upload, file_record.id)
 
     return {
         "message": "File uploaded and location/mapset created automatically",
-        "file": file.filename,
+        "file": final_path.name,
         "location": location,
         "mapset": mapset,
         "epsg": epsg,
-        "session_id": file_record.session_id
+        "session_id": file_record.session_id,
+        "deduplicated": linked
     }
+
+
+@router.post("/upload")
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user: dict = Security(verify_token),
+    db: Session = Depends(get_db)
+):
+
+    user_id = user.get("user_id")
+    username = user.get("username")
+    if not user_id or not username:
+        raise HTTPException(status_code=400, detail="Missing user_id or username in token")
+
+
+    # File validation
+    filename, ext = check_filename(file.filename)
+
+    # Save to a temp directory of this request: same-named uploads do not collide
+    temp_dir = await asyncio.to_thread(_request_temp_dir)
+    try:
+        temp_path = temp_dir / filename
+        # identifies the content for the job result cache
+        content_hash = await _save_upload(file, temp_path)
+        return await store_upload(db, user_id, username, temp_path, content_hash, background_tasks)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, temp_dir, True)
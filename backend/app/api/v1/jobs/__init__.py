@@ -0,0 +1,6 @@
+from fastapi import APIRouter
+from . import events, routes
+
+router = APIRouter()
+router.include_router(events.router)
+router.include_router(routes.router)
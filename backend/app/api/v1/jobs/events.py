@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request, Security
+from fastapi.responses import StreamingResponse
+
+from app.database import SessionLocal
+from app.models.job import Job
+from app.services.actinia.job_poller import ACTIVE_STATUSES, job_event, job_events
+from app.services.auth.jwt import verify_token
+
+router = APIRouter()
+
+# Comment lines sent while idle, so proxies do not close the stream
+KEEPALIVE_SECONDS = 15
+
+
+def _sse(event: dict) -> str:
+    return f"event: job\ndata: {json.dumps(event)}\n\n"
+
+
+def _active_jobs(user_id: int) -> list:
+    # a session of its own: a stream lasts for hours and must not keep a pooled connection
+    with SessionLocal() as db:
+        active = db.query(Job).filter(Job.user_id == user_id, Job.status.in_(ACTIVE_STATUSES)).all()
+        return [job_event(job.id, job.status, job.progress, job.message, job.updated_at) for job in active]
+
+
+@router.get("/events")
+async def stream_job_events(
+    request: Request,
+    user: dict = Security(verify_token)
+):
+    """
+    Server-sent events with the status changes of the user's jobs.
+
+    The current state of the user's active jobs is sent first, then every
+    change the job poller sees.
+    """
+    if not user or not user.get("user_id"):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = user["user_id"]
+
+    # subscribed first, so no change is lost between the snapshot and the stream
+    queue = job_events.subscribe(user_id)
+    try:
+        snapshot = await asyncio.to_thread(_active_jobs, user_id)
+    except BaseException:
+        job_events.unsubscribe(user_id, queue)
+        raise
+
+    async def stream():
+        try:
+            for event in snapshot:
+                yield _sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            job_events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
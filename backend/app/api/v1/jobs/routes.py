@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models.job import Job
+from app.services.actinia.job_cache import input_hashes, job_fingerprint, reuse_matching_job
+from app.services.actinia.scheduler import job_scheduler, user_owns_mapset
+from app.services.actinia.validation import validate_actinia_user
+from app.services.auth.jwt import seal_secret, verify_token
+
+router = APIRouter()
+
+
+class JobSubmit(BaseModel):
+    job_name: str
+    job_type: str
+    location: str
+    mapset: str
+    process_chain: Dict[str, Any]
+    # The chain runs in Actinia as the user, with their own Actinia password
+    actinia_password: str
+    priority: int = Field(default=0, ge=0, le=9)
+    # Input file ids by role and the parameters the result depends on; with them
+    # an identical job is reused instead of run again
+    inputs: Optional[Dict[str, int]] = None
+    params: Optional[Dict[str, Any]] = None
+
+
+def _reuse_cached(db: Session, job: Job, request: JobSubmit) -> Job | None:
+    """
+    Hash the job and satisfy it from a matching one if any (see job_cache); raises ValueError for bad inputs.
+    """
+    hashes = input_hashes(db, job.user_id, request.inputs)
+    job.job_hash = job_fingerprint(
+        request.job_type, hashes, request.params, request.process_chain, request.location, request.mapset
+    )
+    return reuse_matching_job(db, job)
+
+
+@router.post("/")
+async def submit_job(
+    request: JobSubmit,
+    user: dict = Security(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not user or not user.get("user_id") or not user.get("username"):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    if not await run_in_threadpool(user_owns_mapset, db, user["user_id"], request.location, request.mapset):
+        raise HTTPException(status_code=403, detail="Mapset not found among your uploads")
+    if not await validate_actinia_user(user["username"], request.actinia_password):
+        raise HTTPException(status_code=401, detail="Invalid Actinia credentials")
+
+    job = Job(
+        user_id=user["user_id"],
+        job_name=request.job_name,
+        job_type=request.job_type,
+        priority=request.priority,
+        status="queued",
+    )
+
+    if request.inputs is not None and request.params is not None:
+        try:
+            match = await run_in_threadpool(_reuse_cached, db, job, request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if match is not None:
+            return {"job_id": job.id, "status": job.status, "job_type": job.job_type, "reused_job_id": match.id}
+
+    job = await job_scheduler.enqueue(db, job, {
+        "location": request.location,
+        "mapset": request.mapset,
+        "process_chain": request.process_chain,
+        "actinia_user": user["username"],
+        "actinia_password": seal_secret(request.actinia_password),
+    })
+    return {"job_id": job.id, "status": job.status, "job_type": job.job_type}
+
+
+@router.get("/queue")
+async def queue_metrics(user: dict = Security(verify_token)):
+    """
+    Queue depth, limits and wait times per job type.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return await job_scheduler.metrics()
@@ -8,8 +8,8 @@ from  app.schemas.user_schemas import UserCreate, UserOut
 router = APIRouter()
 
 @router.post("/{username}")
-def sync_user(username: str, db: Session = Depends(get_db)):
-    user = sync_user_profile(db, username)
+async def sync_user(username: str, db: Session = Depends(get_db)):
+    user = await sync_user_profile(db, username)
 
     if user:
         return {
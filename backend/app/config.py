@@ -9,6 +9,30 @@ class Settings(BaseSettings):
     ACTINIA_URL: str
     ACTINIA_USER: str
     ACTINIA_PASSWORD: str
+    # Shared Actinia client: seconds per call, pool size, requests in flight, retries of idempotent calls
+    ACTINIA_TIMEOUT: float = 10.0
+    ACTINIA_MAX_CONNECTIONS: int = 20
+    ACTINIA_MAX_CONCURRENCY: int = 10
+    ACTINIA_RETRIES: int = 3
+
+    # Job poller: run it in exactly one process, jobs polled per tick, seconds between polls of a job
+    JOB_POLLER_ENABLED: bool = True
+    JOB_POLL_BATCH_SIZE: int = 50
+    JOB_POLL_MIN_INTERVAL: float = 2.0
+    JOB_POLL_MAX_INTERVAL: float = 60.0
+
+    # Job scheduler: run it in exactly one process; per job type limits override the defaults,
+    # e.g. JOB_TYPE_LIMITS='{"dsm": 8}'
+    JOB_SCHEDULER_ENABLED: bool = True
+    JOB_TYPE_LIMITS: dict[str, int] = {}
+
+    # Threads probing uploads with GDAL/OGR
+    UPLOAD_PROBE_WORKERS: int = 4
+    # After upload, convert rasters to Cloud Optimized GeoTIFF, with this many conversions at once
+    UPLOAD_COG_ENABLED: bool = False
+    UPLOAD_COG_WORKERS: int = 2
+    # Largest resumable upload accepted, in bytes (space for it is allocated up front)
+    RESUMABLE_MAX_UPLOAD_SIZE: int = 20 * 1024 ** 3
 
     # JWT config
     SECRET_KEY: str
@@ -29,6 +53,8 @@ class Settings(BaseSettings):
     VALKEY_HOST: str
     VALKEY_PORT: int
     VALKEY_PASSWORD: str
+    # Shared state (provisioning cache, ...) in Valkey; needs the redis package
+    VALKEY_ENABLED: bool = False
 
     # Additional development settings
     DEBUG: bool
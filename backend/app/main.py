@@ -4,6 +4,13 @@ from app.api.v1.users import router as user_router
 from app.api.v1.users.profile_routes import router as profile_router
 from app.services.auth.permissions import require_role
 from app.api.upload import routes as upload_routes
+from app.api.upload import resumable as resumable_upload_routes
+from app.api.v1.jobs import router as jobs_router
+from app.config import settings
+from app.services.actinia.client import close_actinia_client
+from app.services.actinia.job_poller import job_poller
+from app.services.actinia.scheduler import job_scheduler
+from app.services.valkey import close_valkey
 
 
 
@@ -13,6 +20,23 @@ app = FastAPI(title="FastAPI App is running")
 
 
 
+@app.on_event("startup")
+async def startup():
+    if settings.JOB_POLLER_ENABLED:
+        job_poller.start()
+    if settings.JOB_SCHEDULER_ENABLED:
+        job_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_scheduler.stop()
+    await job_poller.stop()
+    # drop the pooled Actinia connections
+    await close_actinia_client()
+    await close_valkey()
+
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the FastAPI backend!"}
@@ -23,6 +47,8 @@ app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/users", tags=["User Management"])
 app.include_router(profile_router, prefix="/profile", tags=["User Profile"])
 app.include_router(upload_routes.router, prefix="/upload", tags=["Upload"])
+app.include_router(resumable_upload_routes.router, prefix="/upload", tags=["Upload"])
+app.include_router(jobs_router, prefix="/jobs", tags=["Jobs"])
 
 
 
@@ -1,5 +1,7 @@
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSON
 from sqlmodel import SQLModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from app.models.session import Session
 
@@ -14,6 +16,28 @@ class File(SQLModel, table=True):
     format: Optional[str] = Field(default=None)      # "tif", "zip", etc.
     epsg: Optional[int] = Field(default=None)        # e.g., 4326
     valid: bool = Field(default=True)                # set to False if validation fails
+    content_hash: Optional[str] = Field(default=None, index=True)  # sha256 of the file content
+    # The uploaded bytes, before any conversion (see upload_processing.py): what uploads are deduplicated on
+    upload_hash: Optional[str] = Field(default=None, index=True)
+    upload_format: Optional[str] = Field(default=None)
+    storage_path: Optional[str] = Field(default=None)  # where the file is stored; duplicates are hard links
+
+    # Raster metadata, filled in after upload (see services/upload_processing.py)
+    is_cog: bool = Field(default=False)              # stored as a Cloud Optimized GeoTIFF
+    min_x: Optional[float] = Field(default=None)     # extent, in the file's CRS
+    min_y: Optional[float] = Field(default=None)
+    max_x: Optional[float] = Field(default=None)
+    max_y: Optional[float] = Field(default=None)
+    resolution_x: Optional[float] = Field(default=None)
+    resolution_y: Optional[float] = Field(default=None)
+    width: Optional[int] = Field(default=None)
+    height: Optional[int] = Field(default=None)
+    data_type: Optional[str] = Field(default=None)   # GDAL name, e.g. "Float32"
+    nodata: Optional[float] = Field(default=None)
+    band_stats: Optional[List[Dict[str, Any]]] = Field(  # per band: min, max, mean, std (approximate)
+        default=None,
+        sa_column=Column(JSON)
+    )
 
     # step2: GRASS metadata
     location: Optional[str] = Field(default=None)
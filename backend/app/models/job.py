@@ -1,5 +1,8 @@
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSON
 from sqlmodel import SQLModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
+from datetime import datetime
 
 
 class Job(SQLModel, table=True):
@@ -8,8 +11,33 @@ class Job(SQLModel, table=True):
     job_name: str = Field(index=True, nullable=False)
     status: str = Field(index=True, nullable=False)
 
+    # Scheduling: "dsm", "horizon", "solar_daily", "export", ...; higher priorities go first
+    job_type: str = Field(default="generic", index=True, nullable=False)
+    priority: int = Field(default=0, nullable=False)
+    queued_at: Optional[datetime] = Field(default=None)
+    started_at: Optional[datetime] = Field(default=None)
+    # What the scheduler submits (location, mapset, process_chain, ...), kept until the job
+    # is accepted so the queue can be rebuilt after a restart
+    payload: Optional[Dict[str, Any]] = Field(
+        default=None,
+        sa_column=Column(JSON)
+    )
+
+    # Result cache: hash of the inputs' content and parameters; a job satisfied by
+    # another one with the same hash points at it
+    job_hash: Optional[str] = Field(default=None, index=True)
+    joined_job_id: Optional[int] = Field(default=None, index=True)
+
+    # Actinia resource tracked by the job poller
+    resource_url: Optional[str] = Field(default=None)
+    message: Optional[str] = Field(default=None)
+    progress: Optional[float] = Field(default=None)         # 0..1, from Actinia's step / num_of_steps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default=None)    # last status change
+    next_poll_at: Optional[datetime] = Field(default=None, index=True)
+
     def __repr__(self):
         return (
             f"job(id={self.id}, user_id={self.user_id}, "
             f"job_name='{self.job_name}', status='{self.status}')"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+# Bump when the ring generation changes its output, so old entries stop matching
+CACHE_VERSION = 1
+DEFAULT_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+# Shapefiles are spread over several files that all change the result
+SHAPEFILE_SIDECARS = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path, digest=None):
+    """
+    sha256 of a file's content, read in blocks. Pass a digest to keep feeding it.
+    """
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest
+
+
+def hash_input_files(path: Path) -> str:
+    path = Path(path)
+    digest = hashlib.sha256()
+    if path.suffix.lower() == ".shp":
+        for extension in SHAPEFILE_SIDECARS:
+            sidecar = path.with_suffix(extension)
+            if sidecar.exists():
+                digest.update(extension.encode())
+                hash_file(sidecar, digest)
+    else:
+        hash_file(path, digest)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source: Path, target: Path):
+    if target.exists():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        # different filesystem, or no hard link support
+        shutil.copy2(source, target)
+
+
+class BufferCache:
+    """
+    Persistent cache of process_buildings_with_buffers outputs, keyed on content.
+
+    An entry is a directory under root named after the key; it holds the output
+    files plus an optional rings.parquet to return the GeoDataFrame without
+    recomputing. Entries are touched on every hit and the least recently used
+    ones are evicted once the cache grows beyond max_bytes.
+
+    Outputs are hard linked between the cache and the mapsets when possible, so
+    anything rewriting them must replace the file rather than edit it in place.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def for_base_dir(cls, base_dir: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        return cls(base_dir / "data" / "actinia-data" / "cache" / "buffers", max_bytes)
+
+    def key(self, input_path: Path, target_crs: str, **params) -> str:
+        payload = {
+            "version": CACHE_VERSION,
+            "input": hash_input_files(input_path),
+            "target_crs": target_crs,
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def lookup(self, key: str) -> Path | None:
+        entry = self.root / key
+        if not entry.is_dir():
+            self.misses += 1
+            print(f"[Buffer cache] miss {key[:12]} ({self.hits} hits / {self.misses} misses)")
+            return None
+
+        # mtime is the LRU clock
+        os.utime(entry)
+        self.hits += 1
+        print(f"[Buffer cache] hit {key[:12]} ({self.hits} hits / {self.misses} misses)")
+        return entry
+
+    def link_outputs(self, entry: Path, output_dir: Path) -> list[Path]:
+        """
+        Hard link (or copy) the cached output files of an entry into output_dir.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest = json.loads((entry / "manifest.json").read_text())
+        linked = []
+        for name in manifest["outputs"]:
+            _link_or_copy(entry / name, output_dir / name)
+            linked.append(output_dir / name)
+        return linked
+
+    def store(self, key: str, outputs: list[Path], buffer_gdf=None) -> Path:
+        """
+        Add the outputs of a run to the cache, then evict down to max_bytes.
+        """
+        # Build the entry next to its final place and rename it, so readers
+        # never see a half written entry
+        staging = self.root / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        for output in outputs:
+            _link_or_copy(Path(output), staging / Path(output).name)
+        if buffer_gdf is not None:
+            buffer_gdf.to_parquet(staging / "rings.parquet")
+        (staging / "manifest.json").write_text(json.dumps({
+            "outputs": [Path(output).name for output in outputs],
+            "created": time.time(),
+        }))
+
+        entry = self.root / key
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+
+        self.evict()
+        return entry
+
+    def evict(self):
+        entries = [entry for entry in self.root.iterdir() if entry.is_dir() and not entry.name.startswith(".")]
+        sizes = {entry: sum(f.stat().st_size for f in entry.iterdir()) for entry in entries}
+        total = sum(sizes.values())
+
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            print(f"[Buffer cache] evicting {entry.name[:12]}")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    def stats(self) -> dict:
+        entries = [entry for entry in self.root.iterdir() if entry.is_dir() and not entry.name.startswith(".")]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(f.stat().st_size for entry in entries for f in entry.iterdir()),
+            "max_bytes": self.max_bytes,
+        }
@@ -1,45 +1,184 @@
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
+import itertools
 import os
 import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from shapely.geometry import Polygon, MultiPolygon
 from pathlib import Path  
 
+from app.services.actinia.buffer_cache import BufferCache
+from app.services.actinia.buffer_metrics import BufferMetrics
+from app.services.actinia.buffer_state import building_fingerprints, clear_state, load_state, save_state
+from app.services.actinia.buffer_writer import BUFFER_LAYER, write_ring_stream
+
 POSSIBLE_HEIGHT_FIELDS = ['height', 'HEIGHT', 'Height', 'h', 'H', 'ALTEZZA_VO', 'building_h']
 POSSIBLE_SLOPE_FIELDS = ['slope', 'SLOPE', 'Slope']
+# Layers in degrees are reprojected to UTM 32N before buffering in meters
+TARGET_EPSG = 32632
+
+# shapely type ids of the geometries a negative buffer may legitimately return
+_POLYGON_TYPE_ID = 3
+_MULTIPOLYGON_TYPE_ID = 6
+# BaseGeometry.buffer() default, the array function would otherwise use 8
+_QUAD_SEGS = 16
+# Buffers approximate arcs with 16 segments per quarter circle, which can reach
+# up to d * (1 - cos(pi / 64)) ~ 0.12% beyond the exact inward offset
+_ARC_MARGIN = 1.002
+# Buildings per batch when streaming serially: large enough to keep the array
+# calls efficient, small enough to keep the rings of one batch cheap to hold
+STREAM_CHUNK_SIZE = 5_000
 
 
 def detect_field(gdf, possible_fields):
+    # a GeoDataFrame or just the field names of a layer
+    columns = gdf.columns if hasattr(gdf, "columns") else gdf
     for field in possible_fields:
-        if field in gdf.columns:
+        if field in columns:
             return field
     raise ValueError(f"No matching field found in {possible_fields}")
 
 
-def load_and_standardize_buildings(path: str) -> gpd.GeoDataFrame:
+def load_and_standardize_buildings(path: str, bbox=None, mask=None, fid_as_index=False, metrics: BufferMetrics | None = None) -> gpd.GeoDataFrame:
+    """
+    Read the height, slope and geometry of a building layer, in a projected CRS.
+
+    Field names are detected from the layer schema first, so only those two
+    columns are read, through pyogrio's Arrow path. bbox (a (minx, miny, maxx, maxy)
+    tuple in the layer's CRS, or a GeoSeries/GeoDataFrame) or mask (a geometry in
+    the layer's CRS, or a GeoSeries/GeoDataFrame) restricts the read to the
+    buildings intersecting the study area; GDAL answers it from the layer's
+    spatial index when it has one.
+
+    With fid_as_index the rows are indexed by the source feature id, which stays
+    the same whatever part of the layer is read. Read and reprojection times go
+    to the "read" and "reproject" stages of metrics.
+    """
     if not os.path.exists(path):
         raise FileNotFoundError(f"File not found: {path}")
+    if metrics is None:
+        metrics = BufferMetrics()
 
-    gdf = gpd.read_file(path)
+    with metrics.stage("read"):
+        fields = list(pyogrio.read_info(path)["fields"])
+        height_field = detect_field(fields, POSSIBLE_HEIGHT_FIELDS)
+        slope_field = detect_field(fields, POSSIBLE_SLOPE_FIELDS)
 
-    height_field = detect_field(gdf, POSSIBLE_HEIGHT_FIELDS)
-    slope_field = detect_field(gdf, POSSIBLE_SLOPE_FIELDS)
-
-    gdf = gdf[[height_field, slope_field, 'geometry']].copy()
-    gdf = gdf.rename(columns={height_field: 'height', slope_field: 'slope'})
+        gdf = gpd.read_file(
+            path,
+            columns=[height_field, slope_field],
+            bbox=bbox,
+            mask=mask,
+            engine="pyogrio",
+            use_arrow=True,
+            fid_as_index=fid_as_index,
+        )
+        gdf = gdf[[height_field, slope_field, 'geometry']]
+        gdf = gdf.rename(columns={height_field: 'height', slope_field: 'slope'})
 
     # Reproject to UTM 32N only if it's in degrees 
     if gdf.crs and not gdf.crs.is_projected:
-        gdf = gdf.to_crs(epsg=32632)
+        with metrics.stage("reproject"):
+            gdf = gdf.to_crs(epsg=TARGET_EPSG)
 
     return gdf
 
 
+def _study_area_key(bbox, mask) -> dict:
+    """
+    JSON-able description of a study area, for cache keys and incremental state.
+    """
+    def describe(area):
+        if area is None:
+            return None
+        if isinstance(area, (gpd.GeoSeries, gpd.GeoDataFrame)):
+            return [area.crs.to_string() if area.crs else None, shapely.to_wkt(shapely.union_all(area.geometry.values))]
+        if isinstance(area, shapely.Geometry):
+            return shapely.to_wkt(area)
+        return [float(value) for value in area]
+
+    return {"bbox": describe(bbox), "mask": describe(mask)}
+
+
+def max_inward_distance(geometries) -> np.ndarray:
+    """
+    Upper bound of the inward buffer distance that can still leave something of each geometry.
+
+    A negative buffer is empty once the distance reaches the radius of the maximum
+    inscribed circle. That circle fits in the oriented envelope and its area cannot
+    exceed the footprint's, so half the envelope width and sqrt(area / pi) both bound
+    the radius. For the rectangular footprints most buildings have this is the exact
+    radius, at a small fraction of the cost of GEOS' maximum_inscribed_circle.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    bounds = np.zeros(len(geometries))
+
+    present = ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+    try:
+        envelopes = shapely.oriented_envelope(geometries[present])
+    except shapely.errors.GEOSException:
+        # e.g. badly invalid footprints; fall back to trying buffers until one fails
+        bounds[present] = np.inf
+        return bounds
+
+    # degenerate footprints collapse to a point or line envelope and have no inside
+    rectangles = shapely.get_type_id(envelopes) == _POLYGON_TYPE_ID
+    corners = shapely.get_coordinates(shapely.get_exterior_ring(envelopes[rectangles])).reshape(-1, 5, 2)
+    width = np.minimum(
+        np.hypot(*(corners[:, 1] - corners[:, 0]).T),
+        np.hypot(*(corners[:, 2] - corners[:, 1]).T),
+    )
+    radius = np.minimum(width / 2, np.sqrt(shapely.area(geometries[present][rectangles]) / np.pi))
+
+    positions = np.flatnonzero(present)[rectangles]
+    bounds[positions] = radius * _ARC_MARGIN
+    return bounds
+
+
+def inward_distances(geometry, step=0.5):
+    """
+    Yield the buffer distances worth evaluating for one geometry, before any buffering.
+
+    Distances are accumulated exactly like the ring loop does, so they match the
+    distances the rings are generated at. Unbounded geometries yield forever.
+    """
+    bound = max_inward_distance([geometry])[0]
+    distance = step
+    while distance < bound:
+        yield distance
+        distance += step
+
+
+def inward_level_counts(geometries, step=0.5) -> np.ndarray:
+    """
+    Number of buffer distances worth evaluating per geometry, known before any buffering.
+
+    It is also the number of rings a building can produce at most, which makes it
+    a work estimate for splitting a layer into balanced chunks.
+    """
+    bounds = max_inward_distance(geometries)
+    finite = bounds[np.isfinite(bounds)]
+
+    distances = []
+    distance = step
+    while distance < (finite.max() if finite.size else 0):
+        distances.append(distance)
+        distance += step
+
+    counts = np.searchsorted(np.array(distances), bounds, side="left")
+    # unbounded geometries keep trying until a buffer fails
+    return np.where(np.isfinite(bounds), counts, np.iinfo(np.int64).max)
+
+
 def generate_inward_buffers(geometry: Polygon, base_height: float, slope_degrees: float, step=0.5, min_area=1.0):
     buffers = []
-    distance = step
     slope = math.tan(math.radians(slope_degrees))
 
-    while True:
+    for distance in inward_distances(geometry, step):
         inner = geometry.buffer(-distance)
         if inner.is_empty or inner.area < min_area:
             break
@@ -55,58 +194,486 @@ def generate_inward_buffers(geometry: Polygon, base_height: float, slope_degrees
             "height": height,
             "distance": round(distance, 2)
         })
-        distance += step
 
     return buffers
 
 
+def _largest_parts(geoms: np.ndarray) -> np.ndarray:
+    """
+    Replace every MultiPolygon in the array by its largest polygon (first one on ties)
+    """
+    parts, owner = shapely.get_parts(geoms, return_index=True)
+    areas = shapely.area(parts)
+    # lexsort is stable, so among equal areas the first part keeps precedence like max()
+    order = np.lexsort((-areas, owner))
+    _, first = np.unique(owner[order], return_index=True)
+    return parts[order[first]]
+
+
+def _empty_rings(dtype=np.float64):
+    return {
+        "index": np.empty(0, dtype=np.int64),
+        "geometry": np.empty(0, dtype=object),
+        "height": np.empty(0, dtype=dtype),
+        "distance": np.empty(0, dtype=dtype),
+    }
+
+
+def _concat_rings(chunks):
+    if not chunks:
+        return _empty_rings()
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def generate_inward_buffers_batch(geometries, base_heights, slope_degrees, step=0.5, min_area=1.0, dtype=np.float64):
+    """
+    Vectorized generate_inward_buffers for many buildings at once.
+
+    Every step distance is buffered for all still-active buildings in a single
+    shapely array call. The number of levels of each building is bounded up front
+    with inward_level_counts, so buildings leave the batch without a last empty
+    buffer whenever the bound is tight. Rings are returned as columns ordered
+    building by building, then by distance, exactly like calling
+    generate_inward_buffers in a loop: "index" holds the position of the source
+    building in the input arrays.
+
+    Height and distance come back as NumPy columns of the given dtype; the default
+    float64 keeps the values identical to the per-building loop, np.float32 halves
+    their memory when that precision is enough.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    base_heights = np.asarray(base_heights, dtype=np.float64)
+    # math.tan/math.radians per building (not per ring) keeps heights bit-identical to generate_inward_buffers
+    slopes = np.fromiter((math.tan(math.radians(s)) for s in slope_degrees), dtype=np.float64, count=len(geometries))
+
+    levels = inward_level_counts(geometries, step)
+
+    active = np.flatnonzero(~shapely.is_missing(geometries) & (levels > 0))
+    level_index, level_geoms, level_height, level_distance = [], [], [], []
+    distance = step
+    level = 0
+
+    while active.size:
+        inner = shapely.buffer(geometries[active], -distance, quad_segs=_QUAD_SEGS)
+        keep = ~shapely.is_empty(inner) & (shapely.area(inner) >= min_area)
+        type_ids = shapely.get_type_id(inner)
+        keep &= (type_ids == _POLYGON_TYPE_ID) | (type_ids == _MULTIPOLYGON_TYPE_ID)
+
+        active = active[keep]
+        inner = inner[keep]
+        if not active.size:
+            break
+
+        multi = shapely.get_type_id(inner) == _MULTIPOLYGON_TYPE_ID
+        if multi.any():
+            inner[multi] = _largest_parts(inner[multi])
+
+        level_index.append(active)
+        level_geoms.append(inner)
+        level_height.append(np.maximum(base_heights[active] - slopes[active] * distance, 0))
+        level_distance.append(np.full(active.size, round(distance, 2)))
+        distance += step
+        level += 1
+        active = active[levels[active] > level]
+
+    if not level_index:
+        return _empty_rings(dtype)
+
+    index = np.concatenate(level_index)
+    # Rings were produced level by level; a stable sort restores building order
+    order = np.argsort(index, kind="stable")
+    return {
+        "index": index[order],
+        "geometry": np.concatenate(level_geoms)[order],
+        "height": np.concatenate(level_height)[order].astype(dtype, copy=False),
+        "distance": np.concatenate(level_distance)[order].astype(dtype, copy=False),
+    }
+
+
+def _generate_building_rings(gdf: gpd.GeoDataFrame, step=0.5, min_area=1.0):
+    """
+    Run the batched ring generation over a standardized building layer.
+
+    Buildings with a missing geometry or a non numeric height/slope are skipped
+    and returned in the error list as (building index, message), as the
+    per-building loop used to do. If GEOS fails on the batch, buildings are
+    retried one by one so only the faulty ones are dropped.
+    """
+    geometries = gdf.geometry.values
+    heights = np.full(len(gdf), np.nan)
+    slopes = np.full(len(gdf), np.nan)
+    valid = np.ones(len(gdf), dtype=bool)
+    errors = []
+
+    for pos, (idx, geom, height, slope) in enumerate(zip(gdf.index, geometries, gdf["height"], gdf["slope"])):
+        try:
+            if geom is None:
+                raise ValueError("missing geometry")
+            heights[pos] = float(height)
+            slopes[pos] = float(slope)
+        except Exception as e:
+            errors.append((idx, str(e)))
+            valid[pos] = False
+
+    positions = np.flatnonzero(valid)
+    try:
+        rings = generate_inward_buffers_batch(geometries[positions], heights[positions], slopes[positions], step, min_area)
+        rings["index"] = positions[rings["index"]]
+        return rings, errors
+    except shapely.errors.GEOSException:
+        pass
+
+    chunks = []
+    for pos in positions:
+        try:
+            chunk = generate_inward_buffers_batch(geometries[[pos]], heights[[pos]], slopes[[pos]], step, min_area)
+        except shapely.errors.GEOSException as e:
+            errors.append((gdf.index[pos], str(e)))
+            continue
+        chunk["index"][:] = pos
+        chunks.append(chunk)
+
+    return _concat_rings(chunks), errors
+
+
+def _generate_chunk_rings(args):
+    # Module level so the process pool can pickle it
+    chunk, step, min_area = args
+    return _generate_building_rings(chunk, step, min_area)
+
+
+def _chunk_bounds(gdf: gpd.GeoDataFrame, chunks: int, chunk_size=None, step=0.5):
+    """
+    Boundaries of contiguous building chunks, as positions into the layer.
+
+    Without a chunk_size, boundaries are placed so every one of the requested
+    chunks gets about the same number of buffer levels to evaluate.
+    """
+    if chunk_size is None:
+        work = np.minimum(inward_level_counts(gdf.geometry.values, step), 1_000) + 1
+        cumulative = np.cumsum(work)
+        targets = cumulative[-1] * np.arange(1, chunks) / chunks
+        return np.unique(np.concatenate([[0], np.searchsorted(cumulative, targets), [len(gdf)]]))
+    return np.append(np.arange(0, len(gdf), chunk_size), len(gdf))
+
+
+def _iter_ring_chunks(gdf: gpd.GeoDataFrame, workers=1, chunk_size=None, step=0.5, min_area=1.0):
+    """
+    Generate rings chunk by chunk and yield (start, chunk, rings, errors) in layer order.
+
+    Ring indices are positions in the whole layer, start the position of the
+    chunk's first building. With workers > 1 the chunks are
+    generated in a process pool, a few chunks per worker, and still yielded in
+    submission order, so the concatenated output is the same as a serial run.
+    Serial runs without a chunk_size process the layer as one batch.
+    """
+    if len(gdf) == 0:
+        return
+
+    if workers > 1 and len(gdf) > 1:
+        bounds = _chunk_bounds(gdf, workers * 4, chunk_size, step)
+    elif chunk_size is not None:
+        bounds = _chunk_bounds(gdf, 1, chunk_size, step)
+    else:
+        bounds = np.array([0, len(gdf)])
+
+    spans = list(zip(bounds[:-1], bounds[1:]))
+    tasks = ((gdf.iloc[start:end], step, min_area) for start, end in spans)
+
+    if workers > 1 and len(gdf) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # a bounded window of chunks in flight: when the writer is slower than the
+            # workers, finished chunks do not pile up in this process
+            pending = deque()
+            tasks = iter(tasks)
+            for task in itertools.islice(tasks, workers * 2):
+                pending.append(executor.submit(_generate_chunk_rings, task))
+            for start, end in spans:
+                rings, errors = pending.popleft().result()
+                task = next(tasks, None)
+                if task is not None:
+                    pending.append(executor.submit(_generate_chunk_rings, task))
+                rings["index"] += start
+                yield start, gdf.iloc[start:end], rings, errors
+    else:
+        for (start, end), task in zip(spans, tasks):
+            rings, errors = _generate_chunk_rings(task)
+            rings["index"] += start
+            yield start, task[0], rings, errors
+
+
+def _report_chunk(start, chunk: gpd.GeoDataFrame, rings, errors):
+    errors = dict(errors)
+    ring_counts = np.bincount(rings["index"] - start, minlength=len(chunk))
+
+    for pos, (idx, row) in enumerate(chunk.iterrows()):
+        print(f"Processing building index: {idx}")
+        if idx in errors:
+            print(f"Error on building {idx}: {errors[idx]}")
+            continue
+        print(f" - Geometry type: {row.geometry.geom_type}, Height: {row.height}, Slope: {row.slope}")
+        print(f" - Rings generated: {ring_counts[pos]}")
+
+
+def _generated_chunks(gdf: gpd.GeoDataFrame, workers, chunk_size, step, min_area, metrics: BufferMetrics, verbose=False):
+    """
+    _iter_ring_chunks with the generation time and ring statistics recorded in metrics.
+
+    The per-building lines are only printed when verbose; errors always are.
+    """
+    for start, chunk, rings, errors in metrics.iter_stage("buffer", _iter_ring_chunks(gdf, workers, chunk_size, step, min_area)):
+        metrics.record_chunk(start, chunk, rings, errors)
+        with metrics.stage("report"):
+            if verbose:
+                _report_chunk(start, chunk, rings, errors)
+            else:
+                for idx, message in errors:
+                    print(f"Error on building {idx}: {message}")
+        yield start, chunk, rings, errors
+
+
+def _rings_to_gdf(gdf: gpd.GeoDataFrame, rings) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {
+            "geometry": rings["geometry"],
+            "building_id": gdf.index.values[rings["index"]],
+            "height": rings["height"],
+            "distance": rings["distance"],
+        },
+        geometry="geometry",
+        crs=gdf.crs,
+    )
+
+
+def _save_distance_groups(buffer_gdf: gpd.GeoDataFrame, output_dir: Path, distances=None) -> list[Path]:
+    """
+    Write one buffer_<distance>.geojson per distance, only for the given distances if any.
+
+    A distance left without rings has its file removed.
+    """
+    outputs = []
+    groups = dict(list(buffer_gdf.groupby("distance")))
+    for dist in sorted(groups if distances is None else distances):
+        filename = f"buffer_{str(dist).replace('.', '_')}.geojson"
+        output_path = output_dir / filename
+        if dist not in groups:
+            print(f"Removing: {output_path}")
+            output_path.unlink(missing_ok=True)
+            continue
+        print(f"Saving: {output_path}")
+        groups[dist].to_file(output_path, driver="GeoJSON")
+        outputs.append(output_path)
+    return outputs
+
+
+def _match_fingerprints(previous: pd.Series, current: pd.Series) -> pd.Series:
+    """
+    Previous building_id of every current building with an identical previous one, indexed by current building_id.
+
+    Buildings sharing a fingerprint are paired in order of appearance.
+    """
+    def keyed(fingerprints: pd.Series) -> pd.DataFrame:
+        return pd.DataFrame({
+            "fingerprint": fingerprints.values,
+            "occurrence": fingerprints.groupby(fingerprints.values).cumcount().values,
+            "building_id": fingerprints.index,
+        })
+
+    pairs = keyed(current).merge(keyed(previous), on=["fingerprint", "occurrence"], suffixes=("", "_previous"))
+    return pd.Series(pairs["building_id_previous"].values, index=pd.Index(pairs["building_id"].values))
+
+
+def _process_incremental(gdf: gpd.GeoDataFrame, output_dir: Path, workers, chunk_size, output_format, step, min_area, study_area, metrics, verbose):
+    """
+    Recompute rings only for buildings added or changed since the previous run in output_dir.
+
+    Buildings are matched on their fingerprint (geometry WKB, height, slope),
+    not on building_id: the row position shifts for every building after an
+    inserted or deleted one. A matched building keeps its previous rings,
+    renumbered to its current building_id; rings of unmatched previous
+    buildings are dropped, new rings are merged in building order, and only
+    the per-distance files whose rings changed are rewritten, so the outputs
+    are the same as a full run's.
+    """
+    # the output format is part of the state: a state written for gpkg has no geojson files to patch
+    params = {
+        "step": step, "min_area": min_area, "crs": gdf.crs.to_string() if gdf.crs else None,
+        "study_area": study_area, "output_format": output_format,
+    }
+    with metrics.stage("state"):
+        fingerprints = building_fingerprints(gdf)
+        previous, previous_rings = load_state(output_dir, params)
+
+    if previous is None:
+        print("Incremental run: no previous state, processing every building")
+        dirty = np.ones(len(gdf), dtype=bool)
+        kept, dropped = None, None
+    else:
+        previous_of = _match_fingerprints(previous, pd.Series(fingerprints, index=gdf.index))
+        dirty = ~gdf.index.isin(previous_of.index)
+        current_of = pd.Series(previous_of.index, index=previous_of.values)
+        matched = previous_rings["building_id"].isin(current_of.index)
+        kept, dropped = previous_rings[matched].copy(), previous_rings[~matched]
+        moved = kept["building_id"].map(current_of).values != kept["building_id"].values
+        kept["building_id"] = kept["building_id"].map(current_of).astype(gdf.index.dtype).values
+        # unmatched previous buildings whose building_id holds no changed building: deleted, not edited
+        unmatched = previous.index[~previous.index.isin(previous_of.values)]
+        removed = (~unmatched.isin(gdf.index[dirty])).sum()
+        print(f"Incremental run: {dirty.sum()} of {len(gdf)} buildings added or changed, {removed} removed")
+
+    changed = gdf[dirty]
+    new_rings = []
+    for start, chunk, rings, errors in _generated_chunks(changed, workers, chunk_size, step, min_area, metrics, verbose):
+        new_rings.append(rings)
+    new_gdf = _rings_to_gdf(changed, _concat_rings(new_rings))
+
+    if kept is None:
+        buffer_gdf = new_gdf
+        affected = None
+    else:
+        buffer_gdf = pd.concat([kept, new_gdf], ignore_index=True)
+        # back to the order a full run produces: building by building, then by distance
+        order = np.lexsort((buffer_gdf["distance"].values, gdf.index.get_indexer(buffer_gdf["building_id"])))
+        buffer_gdf = buffer_gdf.iloc[order].reset_index(drop=True)
+        # renumbered rings change their file too
+        affected = set(dropped["distance"]) | set(new_gdf["distance"]) | set(kept["distance"][moved])
+
+    if output_format == "geojson":
+        with metrics.stage("write"):
+            _save_distance_groups(buffer_gdf, output_dir, affected)
+        result = buffer_gdf
+    else:
+        # a single file cannot be patched in place; rewrite it from the table, without recomputing
+        def chunks():
+            for start in range(0, len(buffer_gdf), STREAM_CHUNK_SIZE):
+                part = buffer_gdf.iloc[start:start + STREAM_CHUNK_SIZE]
+                yield part["building_id"].values, {
+                    "geometry": part.geometry.values,
+                    "height": part["height"].values,
+                    "distance": part["distance"].values,
+                }
+
+        with metrics.stage("write"):
+            result = write_ring_stream(chunks(), output_dir / BUFFER_LAYER, output_format, gdf.crs, gdf.index.dtype)
+        print(f"Saved: {result}")
+
+    with metrics.stage("state"):
+        save_state(output_dir, params, gdf.index.values, fingerprints, buffer_gdf)
+    return result
+
+
 def process_buildings_with_buffers(
     input_path: str,
     base_dir: Path,
     username: str,
     location: str,
-    mapset: str
+    mapset: str,
+    workers: int = 1,
+    chunk_size: int | None = None,
+    output_format: str = "geojson",
+    step: float = 0.5,
+    min_area: float = 1.0,
+    cache: BufferCache | None = None,
+    incremental: bool = False,
+    bbox=None,
+    mask=None,
+    verbose: bool = False,
+    metrics: BufferMetrics | None = None
 ):
-    gdf = load_and_standardize_buildings(input_path)
-    records = []
+    """
+    Generate the inward buffer rings of every building and save them in the mapset's buffer/ directory.
 
-    for idx, row in gdf.iterrows():
-        print(f"Processing building index: {idx}")
+    With workers > 1 the rings are generated in a pool of that many processes,
+    chunk_size buildings at a time; the outputs are identical to a serial run.
 
-        try:
-            geom = row.geometry
-            base_height = row.height
-            slope_deg = row.slope
-
-            print(f" - Geometry type: {geom.geom_type}, Height: {base_height}, Slope: {slope_deg}")
+    output_format "geojson" writes one buffer_<distance>.geojson per distance and
+    returns the rings as a GeoDataFrame. "gpkg" and "fgb" stream the rings, chunk
+    by chunk, into a single spatially indexed buffers.gpkg / buffers.fgb with a
+    distance attribute and return its path; rings are never all held in memory.
 
-            rings = generate_inward_buffers(geom, base_height, slope_deg)
-            print(f" - Rings generated: {len(rings)}")
+    With a cache, a run on the same file content with the same step, min_area,
+    target CRS and output format links the cached outputs into the mapset and
+    returns right away; otherwise the new outputs are added to the cache.
 
-            for ring in rings:
-                records.append({
-                    "geometry": ring["geometry"],
-                    "building_id": idx,
-                    "height": ring["height"],
-                    "distance": ring["distance"]
-                })
+    With incremental=True, only buildings added or changed since the previous
+    incremental run in this mapset are recomputed and the outputs are patched
+    (see _process_incremental); the cache is not consulted. Non incremental
+    runs discard that state.
 
-        except Exception as e:
-            print(f"Error on building {idx}: {str(e)}")
-            continue
+    bbox and mask restrict the run to the buildings of a study area, see
+    load_and_standardize_buildings.
 
-    buffer_gdf = gpd.GeoDataFrame(records, geometry="geometry", crs=gdf.crs)
+    verbose prints a few lines per building and the metrics report at the end.
+    Pass a BufferMetrics to get the stage timings, ring and vertex histograms
+    and costliest buildings of the run from its summary().
+    """
+    if metrics is None:
+        metrics = BufferMetrics()
 
     # DYNAMIC SAVE PATH
     output_dir = base_dir / "data" / "actinia-data" / "userdata" / username / location / mapset / "buffer"
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    study_area = _study_area_key(bbox, mask)
+
+    if incremental:
+        gdf = load_and_standardize_buildings(input_path, bbox, mask, metrics=metrics)
+        result = _process_incremental(gdf, output_dir, workers, chunk_size, output_format, step, min_area, study_area, metrics, verbose)
+        if verbose:
+            metrics.report()
+        return result
+
+    # the outputs are about to change under whatever state a previous incremental run left
+    clear_state(output_dir)
+
+    if cache is not None:
+        with metrics.stage("cache"):
+            cache_key = cache.key(
+                input_path, f"EPSG:{TARGET_EPSG}",
+                step=step, min_area=min_area, output_format=output_format, study_area=study_area
+            )
+            entry = cache.lookup(cache_key)
+            if entry is not None:
+                outputs = cache.link_outputs(entry, output_dir)
+                if output_format != "geojson":
+                    return outputs[0]
+                return gpd.read_parquet(entry / "rings.parquet")
+
+    gdf = load_and_standardize_buildings(input_path, bbox, mask, metrics=metrics)
+
+    if output_format != "geojson":
+        if workers <= 1 and chunk_size is None:
+            chunk_size = STREAM_CHUNK_SIZE
+
+        def chunks():
+            for start, chunk, rings, errors in _generated_chunks(gdf, workers, chunk_size, step, min_area, metrics, verbose):
+                yield gdf.index.values[rings["index"]], rings
+
+        # generation is pulled by the writer; its time is counted under "buffer", not "write"
+        with metrics.stage("write"):
+            output_path = write_ring_stream(chunks(), output_dir / BUFFER_LAYER, output_format, gdf.crs, gdf.index.dtype)
+        print(f"Saved: {output_path}")
+        if cache is not None:
+            with metrics.stage("cache"):
+                cache.store(cache_key, [output_path])
+        if verbose:
+            metrics.report()
+        return output_path
+
+    all_rings = []
+    for start, chunk, rings, errors in _generated_chunks(gdf, workers, chunk_size, step, min_area, metrics, verbose):
+        all_rings.append(rings)
+    with metrics.stage("buffer"):
+        buffer_gdf = _rings_to_gdf(gdf, _concat_rings(all_rings))
+
     # Save each distance group as a GeoJSON
-    for dist, group in buffer_gdf.groupby("distance"):
-        filename = f"buffer_{str(dist).replace('.', '_')}.geojson"
-        output_path = output_dir / filename
-        print(f"Saving: {output_path}")
-        group.to_file(output_path, driver="GeoJSON")
+    with metrics.stage("write"):
+        outputs = _save_distance_groups(buffer_gdf, output_dir)
 
-    return buffer_gdf
+    if cache is not None:
+        with metrics.stage("cache"):
+            cache.store(cache_key, outputs, buffer_gdf)
 
+    if verbose:
+        metrics.report()
+    return buffer_gdf
@@ -0,0 +1,145 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import shapely
+
+# Histogram buckets are powers of two: 0, 1, 2-3, 4-7, 8-15, ...
+_HISTOGRAM_BUCKETS = 64
+DEFAULT_TOP_N = 10
+
+
+def _bucket_label(bucket: int) -> str:
+    if bucket < 2:
+        return str(bucket)
+    low = 2 ** (bucket - 1)
+    return f"{low}-{2 * low - 1}"
+
+
+def _pow2_buckets(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    buckets = np.zeros(len(values), dtype=np.int64)
+    positive = values > 0
+    buckets[positive] = np.floor(np.log2(values[positive])).astype(np.int64) + 1
+    return np.bincount(buckets, minlength=_HISTOGRAM_BUCKETS)[:_HISTOGRAM_BUCKETS]
+
+
+class BufferMetrics:
+    """
+    Stage timings and ring statistics of a buffer run.
+
+    Pass an instance to process_buildings_with_buffers (or process_buildings_tiled)
+    and read summary() afterwards. Stage times are exclusive wall times: when a
+    stage runs inside another one, e.g. ring generation pulled by the writer, its
+    time is only counted once, under the inner stage.
+
+    Buildings are generated in batches, so there is no per-building wall time;
+    the costliest buildings are ranked by the number of vertices of the rings
+    they produced, which is what the buffer calls spend their time on.
+    """
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N):
+        self.top_n = top_n
+        self.stages = {}
+        self.buildings = 0
+        self.rings = 0
+        self.errors = 0
+        self.ring_histogram = np.zeros(_HISTOGRAM_BUCKETS, dtype=np.int64)
+        self.vertex_histogram = np.zeros(_HISTOGRAM_BUCKETS, dtype=np.int64)
+        self.costliest = []
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name: str):
+        # [name, start, time spent in nested stages]
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def iter_stage(self, name: str, iterable):
+        """
+        Yield from iterable, counting the time spent producing each item under name.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record_chunk(self, start, chunk, rings, errors):
+        """
+        Add the buildings of one chunk, as yielded by _iter_ring_chunks.
+        """
+        ring_counts = np.bincount(rings["index"] - start, minlength=len(chunk))
+        input_vertices = shapely.get_num_coordinates(chunk.geometry.values)
+        ring_vertices = np.bincount(
+            rings["index"] - start,
+            weights=shapely.get_num_coordinates(rings["geometry"]),
+            minlength=len(chunk),
+        ).astype(np.int64)
+
+        self.buildings += len(chunk)
+        self.rings += len(rings["index"])
+        self.errors += len(errors)
+        self.ring_histogram += _pow2_buckets(ring_counts)
+        self.vertex_histogram += _pow2_buckets(input_vertices)
+
+        # only the chunk's own top N can make it to the overall top N
+        top = np.argsort(-ring_vertices, kind="stable")[:self.top_n]
+        self.costliest.extend(
+            {
+                "building_id": building_id,
+                "rings": int(ring_counts[pos]),
+                "ring_vertices": int(ring_vertices[pos]),
+                "input_vertices": int(input_vertices[pos]),
+            }
+            for pos, building_id in zip(top, chunk.index[top].tolist())
+        )
+        self.costliest = sorted(self.costliest, key=lambda b: -b["ring_vertices"])[:self.top_n]
+
+    def merge(self, other: "BufferMetrics"):
+        """
+        Add the counters of another run, e.g. the one of a tile processed in a worker.
+        """
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.buildings += other.buildings
+        self.rings += other.rings
+        self.errors += other.errors
+        self.ring_histogram += other.ring_histogram
+        self.vertex_histogram += other.vertex_histogram
+        self.costliest = sorted(self.costliest + other.costliest, key=lambda b: -b["ring_vertices"])[:self.top_n]
+
+    def summary(self) -> dict:
+        def histogram(counts):
+            return {_bucket_label(bucket): int(count) for bucket, count in enumerate(counts) if count}
+
+        return {
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "total_seconds": round(sum(self.stages.values()), 4),
+            "buildings": self.buildings,
+            "rings": self.rings,
+            "errors": self.errors,
+            "rings_per_building": histogram(self.ring_histogram),
+            "vertices_per_building": histogram(self.vertex_histogram),
+            "costliest_buildings": self.costliest,
+        }
+
+    def report(self):
+        summary = self.summary()
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in summary["stages"].items())
+        print(f"[Buffer metrics] {summary['buildings']} buildings, {summary['rings']} rings, {summary['errors']} errors in {summary['total_seconds']:.2f}s ({stages})")
+        print(f"[Buffer metrics] rings per building: {summary['rings_per_building']}")
+        print(f"[Buffer metrics] vertices per building: {summary['vertices_per_building']}")
+        for building in summary["costliest_buildings"]:
+            print(f"[Buffer metrics]  building {building['building_id']}: {building['rings']} rings, {building['ring_vertices']} ring vertices")
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+# Kept inside the mapset's buffer/ directory, next to the outputs it describes
+STATE_DIR = ".state"
+
+
+def building_fingerprints(gdf: gpd.GeoDataFrame) -> list[str]:
+    """
+    One digest per building over its geometry WKB, height and slope.
+    """
+    wkbs = shapely.to_wkb(gdf.geometry.values)
+    fingerprints = []
+    for wkb, height, slope in zip(wkbs, gdf["height"], gdf["slope"]):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(wkb or b"")
+        digest.update(f"|{height}|{slope}".encode())
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+def load_state(output_dir: Path, params: dict):
+    """
+    Fingerprints (indexed by building_id) and rings of the previous run, or (None, None).
+
+    State written with other parameters is ignored, as is a state left half
+    written by an interrupted run.
+    """
+    state_dir = output_dir / STATE_DIR
+    params_path = state_dir / "params.json"
+    if not params_path.exists() or json.loads(params_path.read_text()) != params:
+        return None, None
+
+    fingerprints = pd.read_parquet(state_dir / "fingerprints.parquet")["fingerprint"]
+    rings = gpd.read_parquet(state_dir / "rings.parquet")
+    return fingerprints, rings
+
+
+def save_state(output_dir: Path, params: dict, building_ids, fingerprints, rings: gpd.GeoDataFrame):
+    state_dir = output_dir / STATE_DIR
+    state_dir.mkdir(parents=True, exist_ok=True)
+    params_path = state_dir / "params.json"
+
+    # params.json is written last: without it the state is considered missing
+    if params_path.exists():
+        params_path.unlink()
+
+    fingerprints = pd.DataFrame({"fingerprint": fingerprints}, index=pd.Index(building_ids, name="building_id"))
+    fingerprints.to_parquet(state_dir / "fingerprints.parquet.tmp")
+    os.replace(state_dir / "fingerprints.parquet.tmp", state_dir / "fingerprints.parquet")
+    rings.to_parquet(state_dir / "rings.parquet.tmp")
+    os.replace(state_dir / "rings.parquet.tmp", state_dir / "rings.parquet")
+
+    params_path.write_text(json.dumps(params))
+
+
+def clear_state(output_dir: Path):
+    shutil.rmtree(output_dir / STATE_DIR, ignore_errors=True)
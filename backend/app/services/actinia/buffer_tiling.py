@@ -0,0 +1,214 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import shapely
+from pyproj import CRS, Transformer
+
+from app.services.actinia.buffer_generator import (
+    STREAM_CHUNK_SIZE,
+    TARGET_EPSG,
+    _generated_chunks,
+    load_and_standardize_buildings,
+)
+from app.services.actinia.buffer_metrics import BufferMetrics
+from app.services.actinia.buffer_writer import write_ring_stream
+
+TILES_DIR = "tiles"
+MANIFEST = "manifest.json"
+# Tiles are read with a small margin so reprojecting the tile box into the
+# layer's CRS can never leave out a building that belongs to the tile
+TILE_READ_MARGIN = 0.01
+
+
+def _tile_key(ix: int, iy: int) -> str:
+    return f"{ix}_{iy}"
+
+
+def build_tile_grid(input_path: str, tile_size: float) -> dict:
+    """
+    Grid of square tiles (in meters of the processing CRS) covering the whole layer.
+
+    The processing CRS is the one load_and_standardize_buildings returns: the
+    layer's own if projected, UTM 32N otherwise. The origin is snapped to the
+    tile size so reruns on the same layer get the same tiles.
+    """
+    info = pyogrio.read_info(input_path, force_total_bounds=True)
+    crs = CRS.from_user_input(info["crs"]) if info["crs"] else None
+    minx, miny, maxx, maxy = info["total_bounds"]
+
+    if crs is not None and not crs.is_projected:
+        target = CRS.from_epsg(TARGET_EPSG)
+        minx, miny, maxx, maxy = Transformer.from_crs(crs, target, always_xy=True).transform_bounds(
+            minx, miny, maxx, maxy, densify_pts=21
+        )
+        crs = target
+
+    x0 = math.floor(minx / tile_size) * tile_size
+    y0 = math.floor(miny / tile_size) * tile_size
+    return {
+        "crs": crs.to_wkt() if crs is not None else None,
+        "tile_size": tile_size,
+        "x0": x0,
+        "y0": y0,
+        "nx": max(1, math.ceil((maxx - x0) / tile_size)),
+        "ny": max(1, math.ceil((maxy - y0) / tile_size)),
+    }
+
+
+def assign_tiles(gdf: gpd.GeoDataFrame, grid: dict):
+    """
+    (ix, iy) tile of every building, from a point guaranteed to lie on the building.
+
+    A centroid can fall outside a U or L shaped footprint, in a tile the building
+    does not even touch, so that tile's read would miss it; the representative
+    point cannot. Each building belongs to exactly one tile.
+    """
+    points = gdf.geometry.representative_point()
+    ix = np.floor((points.x.values - grid["x0"]) / grid["tile_size"])
+    iy = np.floor((points.y.values - grid["y0"]) / grid["tile_size"])
+    # points exactly on the far edge of the grid belong to the last tile
+    return np.clip(ix, 0, grid["nx"] - 1), np.clip(iy, 0, grid["ny"] - 1)
+
+
+def _process_tile(args):
+    """
+    Generate and write the rings of the buildings of one tile. Runs in a worker process.
+    """
+    input_path, grid, ix, iy, output_path, output_format, step, min_area, verbose = args
+    metrics = BufferMetrics()
+    size = grid["tile_size"]
+    margin = size * TILE_READ_MARGIN
+    minx, miny = grid["x0"] + ix * size, grid["y0"] + iy * size
+    area = gpd.GeoSeries([shapely.box(minx - margin, miny - margin, minx + size + margin, miny + size + margin)], crs=grid["crs"])
+
+    # building_id is the source feature id, the same whichever tile reads the building
+    gdf = load_and_standardize_buildings(input_path, bbox=area, fid_as_index=True, metrics=metrics).sort_index()
+    gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty]
+    tile_ix, tile_iy = assign_tiles(gdf, grid)
+    gdf = gdf[(tile_ix == ix) & (tile_iy == iy)]
+
+    if gdf.empty:
+        return _tile_key(ix, iy), 0, 0, None, metrics
+
+    def chunks():
+        for start, chunk, rings, errors in _generated_chunks(gdf, 1, STREAM_CHUNK_SIZE, step, min_area, metrics, verbose):
+            yield gdf.index.values[rings["index"]], rings
+
+    with metrics.stage("write"):
+        path = write_ring_stream(chunks(), output_path, output_format, gdf.crs, gdf.index.dtype)
+    return _tile_key(ix, iy), len(gdf), metrics.rings, str(path), metrics
+
+
+def _save_manifest(tiles_dir: Path, manifest: dict):
+    tmp = tiles_dir / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, tiles_dir / MANIFEST)
+
+
+def tile_progress(output_dir: Path) -> dict | None:
+    """
+    Progress of a tiled run in a buffer/ directory: tiles done and total, per-tile results.
+    """
+    path = Path(output_dir) / TILES_DIR / MANIFEST
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text())
+    return {"done": len(manifest["tiles"]), "total": manifest["total"], "tiles": manifest["tiles"]}
+
+
+def process_buildings_tiled(
+    input_path: str,
+    base_dir: Path,
+    username: str,
+    location: str,
+    mapset: str,
+    tile_size: float = 1000.0,
+    workers: int = 1,
+    output_format: str = "gpkg",
+    step: float = 0.5,
+    min_area: float = 1.0,
+    resume: bool = True,
+    on_progress=None,
+    verbose: bool = False,
+    metrics: BufferMetrics | None = None
+) -> dict:
+    """
+    Tiled, bounded-memory variant of process_buildings_with_buffers for very large layers.
+
+    The layer is covered with a grid of tile_size tiles; each tile reads only the
+    buildings around it (spatial filter), keeps those assigned to it by
+    assign_tiles and streams their rings into buffer/tiles/tile_<ix>_<iy>.<format>.
+    Tiles run one after another, or in a pool of `workers` processes, so peak
+    memory follows the tile size rather than the city size. building_id is the
+    source feature id.
+
+    Finished tiles are recorded in buffer/tiles/manifest.json; with resume, a
+    rerun with the same input and parameters skips them. on_progress(done, total,
+    tile_key) is called after every tile, tile_progress() reads the same state.
+    The metrics of every tile processed in this run are merged into metrics.
+    """
+    if metrics is None:
+        metrics = BufferMetrics()
+
+    output_dir = base_dir / "data" / "actinia-data" / "userdata" / username / location / mapset / "buffer"
+    tiles_dir = output_dir / TILES_DIR
+    tiles_dir.mkdir(parents=True, exist_ok=True)
+
+    grid = build_tile_grid(input_path, tile_size)
+    stat = os.stat(input_path)
+    params = {
+        "input": [str(Path(input_path).resolve()), stat.st_size, stat.st_mtime_ns],
+        "grid": grid,
+        "output_format": output_format,
+        "step": step,
+        "min_area": min_area,
+    }
+
+    manifest_path = tiles_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if resume and manifest_path.exists() else None
+    if manifest is None or manifest["params"] != params:
+        manifest = {"params": params, "total": grid["nx"] * grid["ny"], "tiles": {}}
+        _save_manifest(tiles_dir, manifest)
+
+    pending = [
+        (input_path, grid, ix, iy, tiles_dir / f"tile_{_tile_key(ix, iy)}", output_format, step, min_area, verbose)
+        for iy in range(grid["ny"])
+        for ix in range(grid["nx"])
+        if _tile_key(ix, iy) not in manifest["tiles"]
+    ]
+    if len(pending) < manifest["total"]:
+        print(f"[Tiles] resuming: {manifest['total'] - len(pending)} of {manifest['total']} tiles already done")
+
+    def record(result):
+        key, buildings, rings, path, tile_metrics = result
+        metrics.merge(tile_metrics)
+        manifest["tiles"][key] = {"buildings": buildings, "rings": rings, "path": path, "seconds": round(sum(tile_metrics.stages.values()), 3)}
+        _save_manifest(tiles_dir, manifest)
+        done = len(manifest["tiles"])
+        print(f"[Tiles] {done}/{manifest['total']} tile {key}: {buildings} buildings, {rings} rings")
+        if on_progress is not None:
+            on_progress(done, manifest["total"], key)
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_process_tile, task) for task in pending]
+            for future in as_completed(futures):
+                record(future.result())
+    else:
+        for task in pending:
+            record(_process_tile(task))
+
+    if verbose:
+        metrics.report()
+    return {
+        "tiles": manifest["total"],
+        "outputs": [tile["path"] for _, tile in sorted(manifest["tiles"].items()) if tile["path"]],
+        "buildings": sum(tile["buildings"] for tile in manifest["tiles"].values()),
+        "rings": sum(tile["rings"] for tile in manifest["tiles"].values()),
+    }
@@ -0,0 +1,82 @@
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyogrio
+import shapely
+
+# Single-file outputs: format name -> (OGR driver, file extension)
+STREAM_FORMATS = {
+    "gpkg": ("GPKG", ".gpkg"),
+    "fgb": ("FlatGeobuf", ".fgb"),
+}
+
+BUFFER_LAYER = "buffers"
+
+
+def _ring_schema(id_dtype) -> pa.Schema:
+    return pa.schema([
+        ("building_id", pa.from_numpy_dtype(np.dtype(id_dtype))),
+        ("height", pa.float64()),
+        ("distance", pa.float64()),
+        ("geometry", pa.binary()),
+    ])
+
+
+def _ring_batch(schema: pa.Schema, building_ids, rings) -> pa.RecordBatch:
+    return pa.record_batch(
+        [
+            pa.array(building_ids, type=schema.field("building_id").type),
+            pa.array(rings["height"], type=pa.float64()),
+            pa.array(rings["distance"], type=pa.float64()),
+            pa.array(shapely.to_wkb(rings["geometry"]), type=pa.binary()),
+        ],
+        schema=schema,
+    )
+
+
+def write_ring_stream(chunks, output_path: Path, output_format: str, crs, id_dtype=np.int64) -> Path:
+    """
+    Stream ring chunks into one spatially indexed GeoPackage or FlatGeobuf layer.
+
+    chunks yields (building_ids, rings) pairs, rings being the columns returned by
+    generate_inward_buffers_batch. Each chunk is handed to GDAL as an Arrow record
+    batch and dropped afterwards, so memory does not grow with the number of rings.
+    Distances end up in a "distance" attribute; a layer per distance is one
+    `where="distance = 0.5"` filter away (v.in.ogr / v.import accept it too).
+    FlatGeobuf stores features in spatial index order rather than input order.
+    """
+    if output_format not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported buffer output format: {output_format}")
+
+    driver, extension = STREAM_FORMATS[output_format]
+    output_path = Path(output_path).with_suffix(extension)
+    if output_path.exists():
+        output_path.unlink()
+
+    schema = _ring_schema(id_dtype)
+    batches = (_ring_batch(schema, building_ids, rings) for building_ids, rings in chunks)
+
+    pyogrio.write_arrow(
+        pa.RecordBatchReader.from_batches(schema, batches),
+        str(output_path),
+        layer=BUFFER_LAYER,
+        driver=driver,
+        geometry_name="geometry",
+        geometry_type="Polygon",
+        crs=crs.to_wkt() if crs is not None else None,
+        # both drivers build an R-tree by default; be explicit since Actinia relies on it
+        layer_options={"SPATIAL_INDEX": "YES"},
+    )
+
+    if output_format == "gpkg":
+        # GeoPackage is SQLite: an attribute index makes the per-distance filters cheap
+        conn = sqlite3.connect(output_path)
+        try:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{BUFFER_LAYER}_distance_idx" ON "{BUFFER_LAYER}" (distance)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    return output_path
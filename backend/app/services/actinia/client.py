@@ -0,0 +1,134 @@
+import asyncio
+import random
+
+import httpx
+
+from app.config import settings
+
+# Methods that can be sent again without changing the outcome
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Statuses worth retrying: Actinia or its proxy being busy or restarting
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class ActiniaClient:
+    """
+    Async client for the Actinia REST API sharing one pool of keep-alive connections.
+
+    Paths are relative to <base_url>/api/v3 and calls default to the configured
+    Actinia superuser; pass auth to act as another user. At most max_concurrency
+    requests are in flight at once, the others wait for a slot. Idempotent calls
+    that fail on a connection error or a 429/502/503/504 are retried with
+    exponential backoff and full jitter; other calls are sent once.
+
+    transport lets tests plug in httpx.MockTransport or an ASGI fake of Actinia;
+    a real local fake server only needs its URL as base_url.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth=None,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        transport=None
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=f"{base_url.rstrip('/')}/api/v3",
+            auth=auth,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    def _delay(self, attempt: int, response=None) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+        return delay
+
+    async def request(self, method: str, path: str, retry: bool | None = None, **kwargs) -> httpx.Response:
+        """
+        Send a request; kwargs go to httpx (json, params, auth, timeout, ...).
+
+        retry overrides the idempotency rule, e.g. for a POST that is safe to repeat.
+        """
+        method = method.upper()
+        attempts = 1 + (self.retries if (retry if retry is not None else method in IDEMPOTENT_METHODS) else 0)
+
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                async with self._slots:
+                    response = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                delay = self._delay(attempt)
+                print(f"[Actinia] {method} {path} failed ({e!r}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    return response
+                delay = self._delay(attempt, response)
+                print(f"[Actinia] {method} {path} returned {response.status_code}, retrying in {delay:.2f}s")
+            # wait outside the slot so other calls can use it
+            await asyncio.sleep(delay)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", path, **kwargs)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client: ActiniaClient | None = None
+
+
+def get_actinia_client() -> ActiniaClient:
+    """
+    The application-wide client, created on first use from the settings.
+    """
+    global _client
+    if _client is None:
+        _client = ActiniaClient(
+            settings.ACTINIA_URL,
+            auth=(settings.ACTINIA_USER, settings.ACTINIA_PASSWORD),
+            timeout=settings.ACTINIA_TIMEOUT,
+            max_connections=settings.ACTINIA_MAX_CONNECTIONS,
+            max_concurrency=settings.ACTINIA_MAX_CONCURRENCY,
+            retries=settings.ACTINIA_RETRIES,
+        )
+    return _client
+
+
+def set_actinia_client(client: ActiniaClient | None):
+    """
+    Replace the application-wide client, e.g. by one pointing at a fake Actinia.
+    """
+    global _client
+    _client = client
+
+
+async def close_actinia_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,113 @@
+import math
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from rasterio import windows
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+
+# GeoTIFF internal tiles, in pixels; processing windows are a multiple of it
+DSM_BLOCK_SIZE = 256
+DSM_WINDOW_SIZE = 1024
+
+
+def rasterize_buffers_to_dsm(
+    buffers,
+    output_path: Path,
+    resolution: float = 0.5,
+    nodata: float = -9999.0,
+    window_size: int = DSM_WINDOW_SIZE
+) -> Path:
+    """
+    Rasterize buffer rings into a tiled GeoTIFF keeping the maximum ring height per cell.
+
+    buffers is the GeoDataFrame returned by process_buildings_with_buffers or the
+    path of a buffers.gpkg / buffers.fgb it wrote. Like v.to.rast, a cell takes
+    the value of the rings covering its center; cells outside every ring are nodata.
+    The raster is filled window by window, only burning the rings that intersect
+    the window, so memory does not depend on the size of the area.
+    """
+    if not isinstance(buffers, gpd.GeoDataFrame):
+        buffers = gpd.read_file(buffers, columns=["height"])
+
+    buffers = buffers[buffers["height"].notna() & ~buffers.geometry.is_empty]
+    if buffers.empty:
+        raise ValueError("No buffer rings to rasterize")
+
+    # Burning in ascending height order lets the highest ring win each cell
+    order = np.argsort(buffers["height"].values, kind="stable")
+    geometries = buffers.geometry.values[order]
+    heights = buffers["height"].values[order]
+    tree = shapely.STRtree(geometries)
+
+    # Snap the grid to the resolution so adjacent DSMs line up
+    minx, miny, maxx, maxy = buffers.total_bounds
+    west = math.floor(minx / resolution) * resolution
+    north = math.ceil(maxy / resolution) * resolution
+    width = max(1, math.ceil((maxx - west) / resolution))
+    height = max(1, math.ceil((north - miny) / resolution))
+    transform = from_origin(west, north, resolution, resolution)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    profile = {
+        "driver": "GTiff",
+        "width": width,
+        "height": height,
+        "count": 1,
+        "dtype": "float32",
+        "crs": buffers.crs,
+        "transform": transform,
+        "nodata": nodata,
+        "tiled": True,
+        "blockxsize": DSM_BLOCK_SIZE,
+        "blockysize": DSM_BLOCK_SIZE,
+        "compress": "deflate",
+        "predictor": 3,
+        "BIGTIFF": "IF_SAFER",
+    }
+
+    with rasterio.open(output_path, "w", **profile) as dst:
+        for row_off in range(0, height, window_size):
+            for col_off in range(0, width, window_size):
+                window = windows.Window(col_off, row_off, min(window_size, width - col_off), min(window_size, height - row_off))
+                # query() returns tree positions; sorting them keeps the height order
+                hits = np.sort(tree.query(shapely.box(*windows.bounds(window, transform))))
+                if not hits.size:
+                    tile = np.full((window.height, window.width), nodata, dtype="float32")
+                else:
+                    tile = rasterize(
+                        zip(geometries[hits], heights[hits]),
+                        out_shape=(window.height, window.width),
+                        transform=windows.transform(window, transform),
+                        fill=nodata,
+                        dtype="float32",
+                    )
+                dst.write(tile, 1, window=window)
+
+    return output_path
+
+
+def create_synthetic_dsm(
+    buffers,
+    base_dir: Path,
+    username: str,
+    location: str,
+    mapset: str,
+    resolution: float = 0.5,
+    name: str = "synthetic_dsm"
+) -> Path:
+    """
+    Build the synthetic DSM in-process and place it in the user's mapset dsm/ directory.
+
+    Replaces the v.to.rast per ring layer + r.series round trips for areas small
+    enough to rasterize locally; the GeoTIFF is ready for r.import.
+    """
+    output_dir = base_dir / "data" / "actinia-data" / "userdata" / username / location / mapset / "dsm"
+    output_path = output_dir / f"{name}.tif"
+    print(f"Rasterizing DSM: {output_path}")
+    return rasterize_buffers_to_dsm(buffers, output_path, resolution)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import re
+
+from sqlalchemy.orm import Session
+
+from app.models.file import File
+from app.models.job import Job
+from app.models.result import Result
+
+# Bump when what a job computes from the same inputs changes, so old hashes stop matching
+JOB_HASH_VERSION = 2
+IN_FLIGHT_STATUSES = ("queued", "submitting", "accepted", "running")
+
+
+def canonical_params(params: dict) -> str:
+    """
+    Parameters as a stable string: key order and JSON formatting do not matter.
+    """
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def normalize_chain(value, mapset: str):
+    """
+    A process chain with its own mapset's name replaced by "{mapset}", in values and "name@mapset" references.
+    """
+    if isinstance(value, dict):
+        return {key: normalize_chain(item, mapset) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize_chain(item, mapset) for item in value]
+    if isinstance(value, str):
+        if value == mapset:
+            return "{mapset}"
+        # whole "@mapset" tokens only, not "@mapset_other"
+        return re.sub(rf"@{re.escape(mapset)}(?!\w)", "@{mapset}", value)
+    return value
+
+
+def job_fingerprint(
+    job_type: str,
+    input_hashes: dict,
+    params: dict,
+    process_chain: dict | None = None,
+    location: str | None = None,
+    mapset: str | None = None
+) -> str:
+    """
+    Hash of a job from its type, the content hashes of its inputs (by role, e.g. {"dsm": ...}), its parameters,
+    and the process chain it runs in location.
+
+    The mapset's name is normalized out of the chain, so the same chain run in another mapset matches.
+    """
+    payload = canonical_params({
+        "version": JOB_HASH_VERSION,
+        "job_type": job_type,
+        "inputs": input_hashes,
+        "params": params,
+        "location": location,
+        "process_chain": normalize_chain(process_chain, mapset) if mapset else process_chain,
+    })
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def input_hashes(db: Session, user_id: int, file_ids: dict) -> dict:
+    """
+    Content hashes of the user's input files, by role. Raises ValueError for unknown or unhashed files.
+    """
+    hashes = {}
+    for role, file_id in file_ids.items():
+        file = db.query(File).filter(File.id == file_id, File.user_id == user_id).first()
+        if file is None:
+            raise ValueError(f"File {file_id} not found")
+        if not file.content_hash:
+            raise ValueError(f"File {file_id} has no content hash")
+        hashes[role] = file.content_hash
+    return hashes
+
+
+def find_matching_job(db: Session, job_hash: str, user_id: int) -> Job | None:
+    """
+    A finished job of the user with this hash if any, otherwise one still queued or running.
+
+    Only jobs that actually ran (or will) count, not the ones joined to them.
+    Other users' jobs never match: their results are files in their own mapsets.
+    """
+    query = db.query(Job).filter(Job.job_hash == job_hash, Job.user_id == user_id, Job.joined_job_id.is_(None))
+    finished = query.filter(Job.status == "finished").order_by(Job.id.desc()).first()
+    if finished is not None:
+        return finished
+    return query.filter(Job.status.in_(IN_FLIGHT_STATUSES)).order_by(Job.id).first()
+
+
+def link_results(db: Session, source_job_id: int, target: Job) -> list[Result]:
+    """
+    Give target the results of the source job: new Result rows pointing at the same files.
+    """
+    results = [
+        Result(user_id=target.user_id, job_id=target.id, file_name=result.file_name)
+        for result in db.query(Result).filter(Result.job_id == source_job_id).all()
+    ]
+    db.add_all(results)
+    return results
+
+
+def reuse_matching_job(db: Session, job: Job) -> Job | None:
+    """
+    Satisfy a new job from a matching one, before it is queued.
+
+    With a finished match the job is stored as finished with the match's results
+    linked; with an in-flight match it is stored joined to it, and follows its
+    status from then on. Returns the match, or None when the job has to run.
+    """
+    if not job.job_hash:
+        return None
+    match = find_matching_job(db, job.job_hash, job.user_id)
+    if match is None:
+        return None
+
+    job.joined_job_id = match.id
+    job.status = match.status
+    job.progress = match.progress
+    job.message = match.message
+    db.add(job)
+    db.flush()
+    if match.status == "finished":
+        link_results(db, match.id, job)
+    db.commit()
+    db.refresh(job)
+    print(f"[Job cache] job {job.id} {'reuses' if match.status == 'finished' else 'joins'} job {match.id}")
+    return match
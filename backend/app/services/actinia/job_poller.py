@@ -0,0 +1,247 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import or_, select, update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import Job
+from app.models.result import Result
+from app.services.actinia.client import get_actinia_client
+from app.services.actinia.job_cache import link_results
+
+# Actinia resource statuses
+ACTIVE_STATUSES = ("accepted", "running")
+TERMINAL_STATUSES = ("finished", "error", "terminated")
+
+# Events waiting for a slow subscriber before the oldest ones are dropped
+EVENT_QUEUE_SIZE = 100
+
+
+def poll_interval(age: float, min_interval: float, max_interval: float) -> float:
+    """
+    Seconds until the next poll of a job running for `age` seconds.
+
+    Short jobs get their result quickly; a simulation running for ten minutes
+    is only polled every minute.
+    """
+    return min(max_interval, max(min_interval, age / 10))
+
+
+def job_event(job_id: int, status: str, progress=None, message=None, updated_at=None) -> dict:
+    return {
+        "job_id": job_id,
+        "status": status,
+        "progress": progress,
+        "message": message,
+        "updated_at": updated_at.isoformat() if updated_at else None,
+    }
+
+
+class JobEvents:
+    """
+    In-process fan-out of job status changes to the connected clients of each user.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id: int, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                # a client that does not keep up loses the oldest updates, not the newest
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+job_events = JobEvents()
+
+
+def track_job(db, job: Job, resource_url: str) -> Job:
+    """
+    Hand a submitted job over to the poller: it is polled from the next tick on.
+    """
+    job.resource_url = resource_url
+    job.status = "accepted"
+    job.started_at = job.next_poll_at = datetime.utcnow()
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _parse_status(response: httpx.Response):
+    """
+    (status, progress, message, resources) out of an Actinia resource response;
+    resources are the URLs of the files the job exported.
+    """
+    if response.status_code == 404:
+        return "error", None, "Actinia resource not found", []
+    body = response.json()
+    progress = body.get("progress") or {}
+    steps = progress.get("num_of_steps")
+    fraction = progress.get("step", 0) / steps if steps else None
+    resources = (body.get("urls") or {}).get("resources") or []
+    return body.get("status"), fraction, body.get("message"), resources
+
+
+class JobPoller:
+    """
+    Background task polling the Actinia resources of every active job, in batches.
+
+    Every tick, up to batch_size jobs whose next_poll_at is due are polled
+    concurrently through the shared Actinia client; statuses, progress and next
+    poll times are then written back in one bulk UPDATE, and every change is
+    published to job_events. Jobs are polled at poll_interval(age), so a job's
+    load on Actinia drops as it runs longer.
+
+    Run it in one process only: each poller polls all jobs and publishes to its
+    own process's subscribers.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        events: JobEvents = job_events,
+        batch_size: int = 50,
+        tick: float = 1.0,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0
+    ):
+        self.session_factory = session_factory
+        self.events = events
+        self.batch_size = batch_size
+        self.tick = tick
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._task = None
+
+    def _due_jobs(self, now: datetime) -> list:
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(Job.id, Job.user_id, Job.resource_url, Job.status, Job.progress, Job.message, Job.created_at, Job.started_at)
+                .where(Job.status.in_(ACTIVE_STATUSES))
+                .where(Job.resource_url.is_not(None))
+                .where(or_(Job.next_poll_at.is_(None), Job.next_poll_at <= now))
+                .order_by(Job.next_poll_at)
+                .limit(self.batch_size)
+            )
+            return list(rows)
+
+    def _write(self, rows: list[dict], changed: list[dict], outputs: dict | None = None) -> list:
+        """
+        Store the poll results; jobs joined to a changed job get the same status.
+
+        outputs maps the id of each job that just finished to (user_id,
+        resource URLs); every URL becomes a Result of the job, which jobs joined
+        to it (see job_cache) get linked. Returns (user_id, event) pairs for the
+        joined jobs.
+        """
+        events = []
+        with self.session_factory() as db:
+            # bulk UPDATE by primary key, one statement per set of columns
+            db.execute(update(Job), rows)
+            for job_id, (user_id, resources) in (outputs or {}).items():
+                db.add_all([Result(user_id=user_id, job_id=job_id, file_name=url) for url in resources])
+            # link_results below queries them
+            db.flush()
+
+            changes = {row["id"]: row for row in changed}
+            joined = db.query(Job).filter(Job.joined_job_id.in_(changes)).all() if changes else []
+            for job in joined:
+                change = changes[job.joined_job_id]
+                job.status, job.progress, job.message, job.updated_at = (
+                    change["status"], change["progress"], change["message"], change["updated_at"]
+                )
+                if job.status == "finished":
+                    link_results(db, job.joined_job_id, job)
+                events.append((job.user_id, job_event(job.id, job.status, job.progress, job.message, job.updated_at)))
+            db.commit()
+        return events
+
+    async def _poll(self, client, job):
+        try:
+            response = await client.get(job.resource_url)
+            return _parse_status(response)
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[Job poller] job {job.id}: {e!r}")
+            return None
+
+    async def run_once(self, now: datetime | None = None) -> int:
+        """
+        Poll the jobs due now; returns how many were polled.
+        """
+        now = now or datetime.utcnow()
+        jobs = await asyncio.to_thread(self._due_jobs, now)
+        if not jobs:
+            return 0
+
+        client = get_actinia_client()
+        results = await asyncio.gather(*(self._poll(client, job) for job in jobs))
+
+        rows, changed, events, outputs = [], [], [], {}
+        for job, result in zip(jobs, results):
+            # time in Actinia, not in the scheduler's queue
+            since = job.started_at or job.created_at
+            age = (now - since).total_seconds() if since else 0
+            row = {"id": job.id, "next_poll_at": now + timedelta(seconds=poll_interval(age, self.min_interval, self.max_interval))}
+            if result is not None:
+                status, progress, message, resources = result
+                if (status, progress, message) != (job.status, job.progress, job.message):
+                    row.update(status=status or job.status, progress=progress, message=message, updated_at=now)
+                    events.append((job.user_id, job_event(job.id, row["status"], progress, message, now)))
+                    changed.append(row)
+                    if status == "finished":
+                        outputs[job.id] = (job.user_id, resources)
+            rows.append(row)
+
+        events += await asyncio.to_thread(self._write, rows, changed, outputs)
+        for user_id, event in events:
+            self.events.publish(user_id, event)
+        return len(jobs)
+
+    async def _run(self):
+        while True:
+            try:
+                polled = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. the database restarting: keep the task alive and try again
+                print(f"[Job poller] {e!r}")
+                polled = 0
+            # a full batch means more jobs are due: go on without waiting
+            if polled < self.batch_size:
+                await asyncio.sleep(self.tick)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+job_poller = JobPoller(
+    batch_size=settings.JOB_POLL_BATCH_SIZE,
+    min_interval=settings.JOB_POLL_MIN_INTERVAL,
+    max_interval=settings.JOB_POLL_MAX_INTERVAL,
+)
@@ -0,0 +1,73 @@
+import json
+import time
+
+
+def queue_entry(job_id: int, user_id: int, job_type: str, priority: int, payload: dict, enqueued_at: float | None = None) -> dict:
+    return {
+        "job_id": job_id,
+        "user_id": user_id,
+        "job_type": job_type,
+        "priority": priority,
+        "enqueued_at": enqueued_at or time.time(),
+        "payload": payload,
+    }
+
+
+class MemoryQueueStore:
+    """
+    Waiting jobs kept in process memory, for tests and single-process deployments.
+
+    Only the process that enqueued a job sees it until the scheduler's next
+    start rebuilds the queue from the job table (see JobScheduler.recover).
+    """
+
+    def __init__(self):
+        self._queues: dict[str, dict[int, dict]] = {}
+
+    async def push(self, entry: dict):
+        self._queues.setdefault(entry["job_type"], {})[entry["job_id"]] = entry
+
+    async def job_types(self) -> list[str]:
+        return [job_type for job_type, entries in self._queues.items() if entries]
+
+    async def pending(self, job_type: str) -> list[dict]:
+        return list(self._queues.get(job_type, {}).values())
+
+    async def claim(self, job_type: str, job_id: int) -> bool:
+        return self._queues.get(job_type, {}).pop(job_id, None) is not None
+
+    async def depth(self, job_type: str) -> int:
+        return len(self._queues.get(job_type, {}))
+
+
+class ValkeyQueueStore:
+    """
+    Waiting jobs in Valkey, one hash per job type (job id -> entry), so the queue survives restarts.
+
+    claim() is an HDEL: when several processes pick the same entry, only one gets it.
+    """
+
+    def __init__(self, valkey, prefix: str = "jobs:queue"):
+        self.valkey = valkey
+        self.prefix = prefix
+
+    def _key(self, job_type: str) -> str:
+        return f"{self.prefix}:{job_type}"
+
+    async def push(self, entry: dict):
+        pipe = self.valkey.pipeline()
+        pipe.hset(self._key(entry["job_type"]), str(entry["job_id"]), json.dumps(entry))
+        pipe.sadd(f"{self.prefix}:types", entry["job_type"])
+        await pipe.execute()
+
+    async def job_types(self) -> list[str]:
+        return sorted(await self.valkey.smembers(f"{self.prefix}:types"))
+
+    async def pending(self, job_type: str) -> list[dict]:
+        return [json.loads(value) for value in (await self.valkey.hvals(self._key(job_type)))]
+
+    async def claim(self, job_type: str, job_id: int) -> bool:
+        return await self.valkey.hdel(self._key(job_type), str(job_id)) == 1
+
+    async def depth(self, job_type: str) -> int:
+        return await self.valkey.hlen(self._key(job_type))
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from app.services.valkey import get_valkey
+
+# Locations and mapsets are only known for that long, in case one is deleted behind our back
+PROVISIONING_TTL = 24 * 3600
+# Longest a location creation may hold the cross-process lock
+LOCK_TIMEOUT = 60
+
+
+class ProvisioningCache:
+    """
+    Locations and mapsets known to exist in Actinia, with single-flight locking per location.
+
+    Entries live in process memory and, when Valkey is available, in Valkey sets
+    shared by every worker. lock(location) serializes the provisioning of one
+    location: in the process with an asyncio.Lock, across processes with a
+    Valkey lock, so concurrent uploads share a single creation.
+    """
+
+    def __init__(self, valkey=None, ttl: float = PROVISIONING_TTL):
+        self.valkey = valkey
+        self.ttl = ttl
+        self._known = {}
+        # location -> [lock, holders and waiters]; dropped when the count is back to 0
+        self._locks = {}
+
+    def _key(self, location: str, mapset: str | None = None) -> str:
+        return f"actinia:location:{location}" if mapset is None else f"actinia:mapset:{location}/{mapset}"
+
+    async def _has(self, key: str) -> bool:
+        expiry = self._known.get(key)
+        if expiry is not None and expiry > time.monotonic():
+            return True
+        if self.valkey is not None and await self.valkey.exists(key):
+            self._known[key] = time.monotonic() + self.ttl
+            return True
+        return False
+
+    async def _add(self, keys):
+        expiry = time.monotonic() + self.ttl
+        for key in keys:
+            self._known[key] = expiry
+        if self.valkey is not None and keys:
+            pipe = self.valkey.pipeline()
+            for key in keys:
+                pipe.set(key, 1, ex=int(self.ttl))
+            await pipe.execute()
+
+    async def has_location(self, location: str) -> bool:
+        return await self._has(self._key(location))
+
+    async def has_mapset(self, location: str, mapset: str) -> bool:
+        return await self._has(self._key(location, mapset))
+
+    async def add_locations(self, locations):
+        await self._add([self._key(location) for location in locations])
+
+    async def add_mapsets(self, location: str, mapsets):
+        await self._add([self._key(location, mapset) for mapset in mapsets])
+
+    async def forget(self, location: str, mapset: str | None = None):
+        """
+        Drop an entry found to be stale, e.g. after Actinia reported the mapset missing.
+        """
+        key = self._key(location, mapset)
+        self._known.pop(key, None)
+        if self.valkey is not None:
+            await self.valkey.delete(key)
+
+    @asynccontextmanager
+    async def lock(self, location: str):
+        entry = self._locks.setdefault(location, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if self.valkey is None:
+                    yield
+                    return
+                async with self.valkey.lock(f"actinia:lock:{location}", timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_TIMEOUT):
+                    yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[location]
+
+
+_cache: ProvisioningCache | None = None
+
+
+def get_provisioning_cache() -> ProvisioningCache:
+    global _cache
+    if _cache is None:
+        _cache = ProvisioningCache(get_valkey())
+    return _cache
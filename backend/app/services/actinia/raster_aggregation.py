@@ -1,42 +1,284 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
+
+# A buffer layer to import: a file path, or a (path, where clause) pair selecting
+# the rings of one distance from a single buffers.gpkg / buffers.fgb
+BufferLayer = Union[str, Tuple[str, Optional[str]]]
+
+# Inputs per r.series call in tree aggregation: keeps the command line short
+# and the number of maps r.series holds open bounded
+RSERIES_GROUP_SIZE = 50
+# r.series methods that can be applied group by group: method of the first
+# level -> method combining the partial results in the next levels
+REDUCIBLE_METHODS = {
+    "sum": "sum",
+    "minimum": "minimum",
+    "maximum": "maximum",
+    "count": "sum",
+}
+
+
+def _rasterize_step(step_id: str, vector_name: str, raster_name: str, attribute_column: str):
+    return {
+        "id": step_id,
+        "module": "v.to.rast",
+        "inputs": [
+            {"param": "input", "value": vector_name},
+            {"param": "output", "value": raster_name},
+            {"param": "use", "value": "attr"},
+            {"param": "attribute_column", "value": attribute_column},
+            {"param": "type", "value": "area"}
+        ]
+    }
+
+
+def _rseries_step(step_id: str, raster_inputs: List[str], output: str, method: str = "sum"):
+    return {
+        "id": step_id,
+        "module": "r.series",
+        "inputs": [
+            {"param": "input", "value": ",".join(raster_inputs)},
+            {"param": "output", "value": output},
+            {"param": "method", "value": method}
+        ]
+    }
+
+
+def _import_step(step_id: str, layer: BufferLayer, vector_name: str):
+    path, where = (layer, None) if isinstance(layer, str) else layer
+    inputs = [
+        {"param": "input", "value": path},
+        {"param": "output", "value": vector_name}
+    ]
+    if where:
+        inputs.append({"param": "where", "value": where})
+    return {"id": step_id, "module": "v.in.ogr", "inputs": inputs}
+
+
+def _remove_step(step_id: str, element_type: str, names: Optional[List[str]] = None, pattern: Optional[str] = None):
+    selection = {"param": "name", "value": ",".join(names)} if pattern is None else {"param": "pattern", "value": pattern}
+    return {
+        "id": step_id,
+        "module": "g.remove",
+        "inputs": [
+            {"param": "type", "value": element_type},
+            selection
+        ],
+        "flags": "f"
+    }
+
 
 def generate_rasterization_chain(vector_name: str, raster_name: str, attribute_column: str):
     """
     Create a process chain to rasterize a vector layer using v.to.rast
     """
-    
+
     return {
         "version": "1",
         "list": [
-            {
-                "id": "rasterize_vector",
-                "module": "v.to.rast",
-                "inputs": [
-                    {"param": "input", "value": vector_name},
-                    {"param": "output", "value": raster_name},
-                    {"param": "use", "value": "attr"},
-                    {"param": "attribute_column", "value": attribute_column},
-                    {"param": "type", "value": "area"}
-                ]
-            }
+            _rasterize_step("rasterize_vector", vector_name, raster_name, attribute_column)
         ]
     }
 
-def generate_rseries_chain(raster_inputs: List[str], output_dsm: str):
+def generate_rseries_chain(raster_inputs: List[str], output_dsm: str, method: str = "sum"):
     """
-    Create a process chain to sum multiple rasters using r.series
+    Create a process chain to aggregate multiple rasters using r.series (sum by default)
     """
     return {
         "version": "1",
         "list": [
-            {
-                "id": "aggregate_dsm",
-                "module": "r.series",
-                "inputs": [
-                    {"param": "input", "value": ",".join(raster_inputs)},
-                    {"param": "output", "value": output_dsm},
-                    {"param": "method", "value": "sum"}
-                ]
-            }
+            _rseries_step("aggregate_dsm", raster_inputs, output_dsm, method)
         ]
     }
+
+
+def plan_rseries_tree(raster_inputs: List[str], output: str, group_size: int = RSERIES_GROUP_SIZE) -> List[List[Tuple[str, List[str]]]]:
+    """
+    Levels of a hierarchical r.series: every level is a list of (output, inputs) groups.
+
+    Inputs are reduced group_size at a time into <output>_l<level>_<group>
+    rasters until one group is left, which writes output. A flat r.series is
+    the one level plan of group_size >= len(raster_inputs).
+    """
+    if group_size < 2:
+        raise ValueError("group_size must be at least 2")
+
+    levels = []
+    current = list(raster_inputs)
+    while len(current) > group_size:
+        groups = [current[start:start + group_size] for start in range(0, len(current), group_size)]
+        outputs = [f"{output}_l{len(levels)}_{i}" for i in range(len(groups))]
+        levels.append(list(zip(outputs, groups)))
+        current = outputs
+    levels.append([(output, current)])
+    return levels
+
+
+def _level_method(method: str, level: int, levels: int) -> str:
+    # a single level is a flat r.series, which takes any method
+    if levels > 1 and method not in REDUCIBLE_METHODS:
+        raise ValueError(f"r.series method {method} cannot be aggregated in a tree")
+    return method if level == 0 else REDUCIBLE_METHODS[method]
+
+
+def _rseries_tree_steps(raster_inputs: List[str], output: str, group_size: int, method: str, cleanup: bool):
+    steps = []
+    levels = plan_rseries_tree(raster_inputs, output, group_size)
+    for level, groups in enumerate(levels):
+        for i, (group_output, inputs) in enumerate(groups):
+            step_id = "aggregate_dsm" if len(levels) == 1 else f"aggregate_l{level}_{i}"
+            steps.append(_rseries_step(step_id, inputs, group_output, _level_method(method, level, len(levels))))
+        if cleanup and level > 0:
+            # the partial results this level just consumed
+            steps.append(_remove_step(f"remove_l{level - 1}", "raster", [name for name, _ in levels[level - 1]]))
+    return steps
+
+
+def generate_rseries_tree_chain(
+    raster_inputs: List[str],
+    output_dsm: str,
+    group_size: int = RSERIES_GROUP_SIZE,
+    method: str = "sum",
+    cleanup: bool = True
+):
+    """
+    Create a process chain aggregating rasters with r.series group by group, in one mapset.
+
+    See plan_rseries_tree. Null cells are skipped within a group as in a flat
+    r.series, and a group whose inputs are all null gives null, so the result
+    matches the flat r.series; sums of floating point rasters can only differ
+    by the rounding of the summation order.
+    """
+    return {"version": "1", "list": _rseries_tree_steps(raster_inputs, output_dsm, group_size, method, cleanup)}
+
+
+def generate_rseries_tree_jobs(
+    raster_inputs: List[str],
+    output_dsm: str,
+    input_mapset: str,
+    output_mapset: str,
+    group_size: int = RSERIES_GROUP_SIZE,
+    method: str = "sum",
+    region: Optional[Dict[str, str]] = None
+) -> List[List[dict]]:
+    """
+    Split a tree aggregation into Actinia jobs that can run in parallel, level by level.
+
+    Returns one list of {"mapset", "process_chain"} jobs per level: the jobs of
+    a level are independent, each writing its partial result in its own
+    <output_mapset>_l<level>_<group> mapset, and a level can be submitted once
+    the previous one is finished. The last level writes output_dsm in
+    output_mapset. Inputs are read from input_mapset.
+
+    r.series works on the current region, which in a new mapset is the
+    location's default one; pass region (g.region parameters, e.g.
+    {"raster": "ring_0@mapset"}) to set it in every job. The intermediate
+    mapsets can be deleted once the last level is done.
+    """
+    levels = plan_rseries_tree(raster_inputs, output_dsm, group_size)
+    mapset_of = {name: input_mapset for name in raster_inputs}
+    jobs = []
+
+    for level, groups in enumerate(levels):
+        level_jobs = []
+        for i, (group_output, inputs) in enumerate(groups):
+            mapset = output_mapset if level == len(levels) - 1 else f"{output_mapset}_l{level}_{i}"
+            steps = []
+            if region:
+                steps.append({
+                    "id": "set_region",
+                    "module": "g.region",
+                    "inputs": [{"param": param, "value": value} for param, value in region.items()]
+                })
+            steps.append(_rseries_step(
+                "aggregate_dsm",
+                [f"{name}@{mapset_of[name]}" for name in inputs],
+                group_output,
+                _level_method(method, level, len(levels)),
+            ))
+            mapset_of[group_output] = mapset
+            level_jobs.append({"mapset": mapset, "process_chain": {"version": "1", "list": steps}})
+        jobs.append(level_jobs)
+
+    return jobs
+
+
+def buffers_extent(buffers_path: str) -> Tuple[float, float, float, float]:
+    """
+    (minx, miny, maxx, maxy) of a buffers.gpkg / buffers.fgb, from its header where the format keeps one
+    """
+    import pyogrio
+
+    return tuple(pyogrio.read_info(buffers_path, force_total_bounds=True)["total_bounds"])
+
+
+def ring_layers(buffers_path: str, distances: List[float]) -> List[BufferLayer]:
+    """
+    One buffer layer per distance out of a single buffers.gpkg / buffers.fgb
+    """
+    return [(buffers_path, f"distance = {distance}") for distance in distances]
+
+
+def generate_fused_dsm_chain(
+    buffer_layers: List[BufferLayer],
+    output_dsm: str,
+    attribute_column: str = "height",
+    method: str = "sum",
+    resolution: Optional[float] = None,
+    cleanup: bool = True,
+    group_size: Optional[int] = None,
+    extent: Optional[Tuple[float, float, float, float]] = None
+):
+    """
+    Create one process chain doing the whole rasterize-and-aggregate workflow.
+
+    Each buffer layer is imported with v.in.ogr and rasterized with v.to.rast,
+    the rasters are aggregated with r.series into output_dsm, then the
+    intermediate vectors and rasters are removed. A DSM of N rings is a single
+    Actinia submission instead of N + 1.
+
+    With a resolution, the region is first set to extent (minx, miny, maxx,
+    maxy, e.g. from buffers_extent), or else to the extent of the imported
+    rings. With a group_size, the rasters are aggregated as a tree (see
+    generate_rseries_tree_chain); no step then lists every ring, so an extent
+    is required with a resolution.
+    """
+    vectors = [f"{output_dsm}_ring_{i}" for i in range(len(buffer_layers))]
+    rasters = [f"{vector}_rast" for vector in vectors]
+
+    steps = [
+        _import_step(f"import_ring_{i}", layer, vector)
+        for i, (layer, vector) in enumerate(zip(buffer_layers, vectors))
+    ]
+    if resolution is not None:
+        if extent is not None:
+            minx, miny, maxx, maxy = extent
+            bounds = [
+                {"param": "n", "value": str(maxy)},
+                {"param": "s", "value": str(miny)},
+                {"param": "e", "value": str(maxx)},
+                {"param": "w", "value": str(minx)}
+            ]
+        elif group_size is None:
+            bounds = [{"param": "vector", "value": ",".join(vectors)}]
+        else:
+            raise ValueError("An extent is required to set the resolution of a tree aggregation")
+        steps.append({
+            "id": "set_region",
+            "module": "g.region",
+            "inputs": bounds + [{"param": "res", "value": str(resolution)}],
+            "flags": "a"
+        })
+    steps += [
+        _rasterize_step(f"rasterize_ring_{i}", vector, raster, attribute_column)
+        for i, (vector, raster) in enumerate(zip(vectors, rasters))
+    ]
+    if group_size is None:
+        steps.append(_rseries_step("aggregate_dsm", rasters, output_dsm, method))
+    else:
+        steps += _rseries_tree_steps(rasters, output_dsm, group_size, method, cleanup)
+    if cleanup:
+        # by pattern: the names of hundreds of rings would not fit on one command line
+        steps.append(_remove_step("remove_ring_rasters", "raster", pattern=f"{output_dsm}_ring_*"))
+        steps.append(_remove_step("remove_ring_vectors", "vector", pattern=f"{output_dsm}_ring_*"))
+
+    return {"version": "1", "list": steps}
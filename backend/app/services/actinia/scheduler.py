@@ -0,0 +1,306 @@
+import asyncio
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from sqlalchemy import func, or_, select, update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.file import File
+from app.models.job import Job
+from app.services.actinia.client import get_actinia_client
+from app.services.actinia.job_poller import ACTIVE_STATUSES, job_event, job_events
+from app.services.actinia.job_queue import MemoryQueueStore, ValkeyQueueStore, queue_entry
+from app.services.auth.jwt import open_secret
+from app.services.valkey import get_valkey
+
+# Jobs of a type running in Actinia at once, from the capacity targets of the design doc
+JOB_TYPE_LIMITS = {
+    "dsm": 5,
+    "horizon": 3,
+    "solar_daily": 2,
+    "export": 20,
+}
+DEFAULT_JOB_LIMIT = 2
+# Claimed from the queue, not yet accepted by Actinia
+SUBMITTING = "submitting"
+# Wait times kept per job type for the percentiles
+WAIT_SAMPLES = 500
+
+
+def user_owns_mapset(db, user_id: int, location: str, mapset: str) -> bool:
+    """
+    Whether the user uploaded into location/mapset: the only mapsets their jobs may run in.
+    """
+    owned = db.query(File.id).filter(File.user_id == user_id, File.location == location, File.mapset == mapset)
+    return owned.first() is not None
+
+
+async def submit_process_chain(entry: dict) -> str:
+    """
+    Send a queued job's process chain to Actinia; returns the resource status URL.
+
+    It is sent as the user in the payload's actinia_user and (sealed)
+    actinia_password, or as the superuser for jobs the backend runs itself.
+    """
+    payload = entry["payload"]
+    # no auth argument at all means the client's superuser; auth=None would send none
+    kwargs = {}
+    if payload.get("actinia_user"):
+        kwargs["auth"] = (payload["actinia_user"], open_secret(payload["actinia_password"]))
+    response = await get_actinia_client().post(
+        f"/locations/{payload['location']}/mapsets/{payload['mapset']}/processing_async",
+        json=payload["process_chain"],
+        **kwargs,
+    )
+    response.raise_for_status()
+    return response.json()["urls"]["status"]
+
+
+def _save_job(db, job: Job) -> Job:
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class JobScheduler:
+    """
+    Queue of jobs waiting for Actinia capacity, dispatched by priority within per-type limits.
+
+    A job type never has more than its limit of jobs accepted or running in
+    Actinia, counted from the job table so restarts do not lose track. Among
+    the waiting jobs of a type, higher priorities go first; at equal priority
+    the user with the fewest jobs of that type in flight goes first, then the
+    oldest job, so one user's burst cannot starve the others.
+
+    Waiting jobs are kept in the store, and their payload in the job table
+    until Actinia accepts them. On start, the queued jobs missing from the
+    store, and the ones left "submitting" by a crash, are pushed again (see
+    recover), so a job is submitted at least once. Like the job poller, run
+    one dispatcher.
+    """
+
+    def __init__(
+        self,
+        store,
+        submit=submit_process_chain,
+        limits: dict | None = None,
+        session_factory=SessionLocal,
+        tick: float = 1.0
+    ):
+        self.store = store
+        self.submit = submit
+        self.limits = {**JOB_TYPE_LIMITS, **(limits or {})}
+        self.session_factory = session_factory
+        self.tick = tick
+        self._wake = asyncio.Event()
+        self._task = None
+        self._waits = {}
+        self._dispatched = Counter()
+
+    def limit(self, job_type: str) -> int:
+        return self.limits.get(job_type, DEFAULT_JOB_LIMIT)
+
+    async def enqueue(self, db, job: Job, payload: dict) -> Job:
+        """
+        Queue a job; payload holds the location, mapset and process_chain to submit.
+        """
+        job.status = "queued"
+        job.queued_at = datetime.utcnow()
+        job.payload = payload
+        job = await asyncio.to_thread(_save_job, db, job)
+        await self.store.push(queue_entry(job.id, job.user_id, job.job_type, job.priority, payload))
+        self._wake.set()
+        return job
+
+    def _in_flight(self, job_type: str) -> Counter:
+        """
+        Jobs of a type accepted or running in Actinia, per user.
+        """
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(Job.user_id, func.count())
+                .where(Job.job_type == job_type, Job.status.in_(ACTIVE_STATUSES + (SUBMITTING,)))
+                # jobs joined to another one take no Actinia capacity
+                .where(Job.joined_job_id.is_(None))
+                .group_by(Job.user_id)
+            )
+            return Counter(dict(rows.all()))
+
+    def _set_status(self, job_id: int, **values):
+        with self.session_factory() as db:
+            db.execute(update(Job).where(Job.id == job_id).values(**values))
+            # jobs joined to this one (see job_cache) follow its status
+            shared = {key: values[key] for key in ("status", "message", "updated_at") if key in values}
+            db.execute(update(Job).where(Job.joined_job_id == job_id).values(**shared))
+            db.commit()
+
+    def _next_entries(self, pending: list, in_flight: Counter, slots: int) -> list:
+        chosen = []
+        pending = list(pending)
+        in_flight = Counter(in_flight)
+        while pending and len(chosen) < slots:
+            entry = min(pending, key=lambda e: (-e["priority"], in_flight[e["user_id"]], e["enqueued_at"]))
+            pending.remove(entry)
+            in_flight[entry["user_id"]] += 1
+            chosen.append(entry)
+        return chosen
+
+    def _recoverable(self) -> list:
+        """
+        Queue entries of the queued and submitting jobs, from the job table; the submitting ones are queued again.
+        """
+        with self.session_factory() as db:
+            jobs = (
+                db.query(Job)
+                .filter(Job.status.in_(("queued", SUBMITTING)), Job.joined_job_id.is_(None), Job.payload.is_not(None))
+                .all()
+            )
+            entries = [
+                queue_entry(
+                    job.id, job.user_id, job.job_type, job.priority, job.payload,
+                    job.queued_at.replace(tzinfo=timezone.utc).timestamp() if job.queued_at else None,
+                )
+                for job in jobs
+            ]
+            # a crash between the claim and Actinia's answer: it may or may not have been submitted
+            stuck = [job.id for job in jobs if job.status == SUBMITTING]
+            if stuck:
+                db.execute(
+                    update(Job).where(or_(Job.id.in_(stuck), Job.joined_job_id.in_(stuck))).values(status="queued")
+                )
+                db.commit()
+        return entries
+
+    async def recover(self) -> int:
+        """
+        Push the queued jobs missing from the store again; returns how many.
+        """
+        entries = await asyncio.to_thread(self._recoverable)
+        waiting = {}
+        recovered = 0
+        for entry in entries:
+            job_type = entry["job_type"]
+            if job_type not in waiting:
+                waiting[job_type] = {e["job_id"] for e in await self.store.pending(job_type)}
+            if entry["job_id"] not in waiting[job_type]:
+                await self.store.push(entry)
+                recovered += 1
+        if recovered:
+            print(f"[Scheduler] {recovered} queued jobs recovered from the job table")
+        return recovered
+
+    async def _start(self, entry: dict):
+        job_id = entry["job_id"]
+        await asyncio.to_thread(self._set_status, job_id, status=SUBMITTING)
+        try:
+            resource_url = await self.submit(entry)
+        except Exception as e:
+            print(f"[Scheduler] job {job_id} could not be submitted: {e!r}")
+            await asyncio.to_thread(
+                self._set_status, job_id, status="error", message=str(e), payload=None, updated_at=datetime.utcnow()
+            )
+            job_events.publish(entry["user_id"], job_event(job_id, "error", message=str(e), updated_at=datetime.utcnow()))
+            return
+
+        now = datetime.utcnow()
+        # from here on the job poller follows it
+        await asyncio.to_thread(
+            self._set_status, job_id,
+            status="accepted", resource_url=resource_url, started_at=now, next_poll_at=now, updated_at=now, payload=None,
+        )
+        job_events.publish(entry["user_id"], job_event(job_id, "accepted", updated_at=now))
+
+    async def dispatch_once(self) -> int:
+        """
+        Submit as many waiting jobs as the limits allow; returns how many were started.
+        """
+        started = 0
+        for job_type in await self.store.job_types():
+            pending = await self.store.pending(job_type)
+            if not pending:
+                continue
+            in_flight = await asyncio.to_thread(self._in_flight, job_type)
+            slots = self.limit(job_type) - sum(in_flight.values())
+            if slots <= 0:
+                continue
+
+            for entry in self._next_entries(pending, in_flight, slots):
+                if not await self.store.claim(job_type, entry["job_id"]):
+                    continue
+                wait = time.time() - entry["enqueued_at"]
+                self._waits.setdefault(job_type, deque(maxlen=WAIT_SAMPLES)).append(wait)
+                self._dispatched[job_type] += 1
+                await self._start(entry)
+                started += 1
+        return started
+
+    async def metrics(self) -> dict:
+        """
+        Per job type: limit, waiting jobs, oldest wait, and wait times of the dispatched ones.
+        """
+        types = set(self.limits) | set(await self.store.job_types())
+        now = time.time()
+        report = {}
+        for job_type in sorted(types):
+            pending = await self.store.pending(job_type)
+            waits = sorted(self._waits.get(job_type, ()))
+            report[job_type] = {
+                "limit": self.limit(job_type),
+                "queued": len(pending),
+                "oldest_wait_seconds": round(now - min(e["enqueued_at"] for e in pending), 1) if pending else 0.0,
+                "dispatched": self._dispatched[job_type],
+                "wait_p50_seconds": round(waits[len(waits) // 2], 1) if waits else None,
+                "wait_p95_seconds": round(waits[int(len(waits) * 0.95)], 1) if waits else None,
+                "wait_max_seconds": round(waits[-1], 1) if waits else None,
+            }
+        return report
+
+    async def _run(self):
+        recovered = False
+        while True:
+            try:
+                if not recovered:
+                    await self.recover()
+                    recovered = True
+                await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Scheduler] {e!r}")
+            # slots free up as the poller sees jobs finish: check again every tick, or at once on enqueue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _default_store():
+    valkey = get_valkey()
+    if valkey is not None:
+        return ValkeyQueueStore(valkey)
+    print(
+        "[Scheduler] WARNING: VALKEY_ENABLED is off, the job queue is kept in process memory. "
+        "Jobs enqueued by other API processes only reach the scheduler when it restarts; "
+        "run a single API process or enable Valkey."
+    )
+    return MemoryQueueStore()
+
+
+job_scheduler = JobScheduler(_default_store(), limits=settings.JOB_TYPE_LIMITS)
@@ -0,0 +1,291 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.job import Job
+from app.services.actinia.client import get_actinia_client
+from app.services.actinia.job_poller import TERMINAL_STATUSES, poll_interval
+from app.services.actinia.provisioning import get_provisioning_cache
+from app.services.actinia.raster_aggregation import (
+    RSERIES_GROUP_SIZE,
+    _remove_step,
+    _rseries_step,
+    generate_rseries_chain,
+    generate_rseries_tree_chain,
+)
+from app.services.actinia.scheduler import job_scheduler, user_owns_mapset
+from app.services.actinia.validation import validate_actinia_user
+from app.services.auth.jwt import seal_secret
+from app.utils.geospatial import create_location_and_mapset
+
+# One r.sun run: day of year and, for instantaneous irradiance, the local solar hour
+TimeStep = Tuple[int, Optional[float]]
+
+# Aggregation over time -> r.series method used within and across slices;
+# a mean is summed, then divided by the number of time steps
+SOLAR_METHODS = {
+    "sum": "sum",
+    "mean": "sum",
+    "max": "maximum",
+}
+SLICE_UNITS = ("day", "hour")
+# Scheduler job type of the slices and the aggregate (see JOB_TYPE_LIMITS)
+SOLAR_JOB_TYPE = "solar_daily"
+
+
+def plan_time_slices(
+    start_day: int,
+    end_day: int,
+    hours: Optional[Iterable[float]] = None,
+    slice_by: str = "day"
+) -> List[List[TimeStep]]:
+    """
+    Split days start_day..end_day (inclusive) into slices of r.sun time steps.
+
+    Without hours every day is one r.sun run of daily irradiation; with hours
+    it is one run per hour. slice_by="day" puts the runs of a day in one slice,
+    slice_by="hour" makes every run its own slice.
+    """
+    if not 1 <= start_day <= end_day <= 365:
+        raise ValueError("Days must satisfy 1 <= start_day <= end_day <= 365")
+    if slice_by not in SLICE_UNITS:
+        raise ValueError(f"slice_by must be one of {', '.join(SLICE_UNITS)}")
+
+    hours = list(hours) if hours else [None]
+    days = range(start_day, end_day + 1)
+    if slice_by == "day":
+        return [[(day, hour) for hour in hours] for day in days]
+    return [[(day, hour)] for day in days for hour in hours]
+
+
+def _rsun_step(step_id: str, elevation: str, time_step: TimeStep, output: str, options: Dict[str, str]):
+    day, hour = time_step
+    inputs = [
+        {"param": "elevation", "value": elevation},
+        {"param": "day", "value": str(day)},
+    ]
+    if hour is not None:
+        inputs.append({"param": "time", "value": str(hour)})
+    inputs.append({"param": "glob_rad", "value": output})
+    inputs += [{"param": param, "value": value} for param, value in options.items()]
+    return {"id": step_id, "module": "r.sun", "inputs": inputs}
+
+
+def _region_step(region: Dict[str, str]):
+    return {
+        "id": "set_region",
+        "module": "g.region",
+        "inputs": [{"param": param, "value": value} for param, value in region.items()]
+    }
+
+
+def generate_solar_slice_chain(
+    time_steps: List[TimeStep],
+    elevation: str,
+    output: str,
+    method: str = "sum",
+    options: Optional[Dict[str, str]] = None,
+    region: Optional[Dict[str, str]] = None
+):
+    """
+    Create a process chain running r.sun for the time steps of one slice.
+
+    A single step writes output directly; several are aggregated with r.series
+    into output and removed.
+    """
+    options = options or {}
+    steps = [_region_step(region)] if region else []
+    if len(time_steps) == 1:
+        steps.append(_rsun_step("solar_0", elevation, time_steps[0], output, options))
+        return {"version": "1", "list": steps}
+
+    step_rasters = [f"{output}_t{i}" for i in range(len(time_steps))]
+    steps += [
+        _rsun_step(f"solar_{i}", elevation, time_step, raster, options)
+        for i, (time_step, raster) in enumerate(zip(time_steps, step_rasters))
+    ]
+    steps.append(_rseries_step("aggregate_slice", step_rasters, output, SOLAR_METHODS[method]))
+    steps.append(_remove_step("remove_steps", "raster", step_rasters))
+    return {"version": "1", "list": steps}
+
+
+def generate_solar_fanout_jobs(
+    elevation: str,
+    output: str,
+    output_mapset: str,
+    start_day: int,
+    end_day: int,
+    hours: Optional[Iterable[float]] = None,
+    slice_by: str = "day",
+    method: str = "sum",
+    options: Optional[Dict[str, str]] = None,
+    region: Optional[Dict[str, str]] = None,
+    group_size: int = RSERIES_GROUP_SIZE
+) -> dict:
+    """
+    Split a solar simulation over a time range into Actinia jobs that can run in parallel.
+
+    Returns {"elevation", "slices": [...], "aggregate": ...}, each job a {"mapset",
+    "process_chain"}. Every slice (see plan_time_slices) runs r.sun in its own
+    temporary <output_mapset>_sun_<i> mapset, so the slices can run at once on
+    different Actinia workers; once they are all finished, the aggregate job
+    combines them with r.series into output in output_mapset. method is "sum",
+    "mean" or "max" over all time steps.
+
+    elevation must be qualified with its mapset ("dsm@mapset"), and is the
+    region of every job unless region (g.region parameters) is given. options
+    are passed to every r.sun run, e.g. {"linke_value": "3.0", "nprocs": "4"}.
+    """
+    if method not in SOLAR_METHODS:
+        raise ValueError(f"method must be one of {', '.join(SOLAR_METHODS)}")
+    if "@" not in elevation:
+        raise ValueError("elevation must be qualified with its mapset (name@mapset)")
+
+    region = region or {"raster": elevation}
+    slices = plan_time_slices(start_day, end_day, hours, slice_by)
+
+    slice_jobs = []
+    slice_outputs = []
+    for i, time_steps in enumerate(slices):
+        mapset = f"{output_mapset}_sun_{i}"
+        slice_output = f"{output}_s{i}"
+        slice_jobs.append({
+            "mapset": mapset,
+            "process_chain": generate_solar_slice_chain(time_steps, elevation, slice_output, method, options, region),
+        })
+        slice_outputs.append(f"{slice_output}@{mapset}")
+
+    total = output if method != "mean" else f"{output}_sum"
+    if len(slice_outputs) <= group_size:
+        chain = generate_rseries_chain(slice_outputs, total, SOLAR_METHODS[method])
+    else:
+        chain = generate_rseries_tree_chain(slice_outputs, total, group_size, SOLAR_METHODS[method])
+    chain["list"].insert(0, _region_step(region))
+    if method == "mean":
+        time_steps = sum(len(time_steps) for time_steps in slices)
+        chain["list"].append({
+            "id": "average",
+            "module": "r.mapcalc",
+            "inputs": [{"param": "expression", "value": f"{output} = {total} / {time_steps}.0"}]
+        })
+        chain["list"].append(_remove_step("remove_sum", "raster", [total]))
+
+    return {"elevation": elevation, "slices": slice_jobs, "aggregate": {"mapset": output_mapset, "process_chain": chain}}
+
+
+def _job_statuses(session_factory, job_ids: List[int]) -> Dict[int, Tuple[str, Optional[str]]]:
+    with session_factory() as db:
+        rows = db.query(Job.id, Job.status, Job.message).filter(Job.id.in_(job_ids)).all()
+        return {job_id: (status, message) for job_id, status, message in rows}
+
+
+def _owned_mapsets(session_factory, user_id: int, location: str, mapsets: List[str]) -> List[str]:
+    with session_factory() as db:
+        return [mapset for mapset in mapsets if user_owns_mapset(db, user_id, location, mapset)]
+
+
+async def _enqueue_jobs(scheduler, location: str, jobs: List[dict], user_id: int, credentials: dict, job_name: str, priority: int) -> List[int]:
+    """
+    Queue jobs of type solar_daily with the scheduler; returns their Job ids.
+    """
+    ids = []
+    with scheduler.session_factory() as db:
+        for job in jobs:
+            queued = await scheduler.enqueue(
+                db,
+                Job(user_id=user_id, job_name=f"{job_name} {job['mapset']}", job_type=SOLAR_JOB_TYPE, priority=priority, status="queued"),
+                {"location": location, **job, **credentials},
+            )
+            ids.append(queued.id)
+    return ids
+
+
+async def _wait_for_jobs(scheduler, job_ids: List[int], min_interval: float, max_interval: float, on_done=None) -> Dict[int, Tuple[str, Optional[str]]]:
+    """
+    Wait until every job reached a terminal status, as the job poller records it; returns (status, message) by id.
+    """
+    started = time.monotonic()
+    done = set()
+    while True:
+        statuses = await asyncio.to_thread(_job_statuses, scheduler.session_factory, job_ids)
+        finished = {job_id for job_id, (status, _) in statuses.items() if status in TERMINAL_STATUSES}
+        if on_done is not None and len(finished) > len(done):
+            on_done(len(finished))
+        done = finished
+        if len(done) == len(job_ids):
+            return statuses
+        await asyncio.sleep(poll_interval(time.monotonic() - started, min_interval, max_interval))
+
+
+async def _remove_mapsets(location: str, mapsets: List[str]):
+    client = get_actinia_client()
+    cache = get_provisioning_cache()
+    for mapset in mapsets:
+        response = await client.delete(f"/locations/{location}/mapsets/{mapset}")
+        await cache.forget(location, mapset)
+        if response.status_code != 200:
+            print(f"[Solar] could not remove mapset {mapset}: {response.text}")
+
+
+async def run_solar_fanout(
+    location: str,
+    jobs: dict,
+    epsg: int,
+    user_id: int,
+    username: str,
+    actinia_password: str,
+    job_name: str = "solar",
+    priority: int = 0,
+    min_interval: float = 2.0,
+    max_interval: float = 60.0,
+    cleanup: bool = True,
+    on_progress=None,
+    scheduler=None
+):
+    """
+    Run the jobs of generate_solar_fanout_jobs as Job rows of the user: the
+    slices, then the aggregate.
+
+    Like POST /jobs/, the output mapset and the elevation's mapset must be
+    among the user's uploads (PermissionError otherwise), and the jobs run in
+    Actinia as the user, with actinia_password. Every job is queued with the
+    job scheduler as a solar_daily job, so the slices run at most
+    JOB_TYPE_LIMITS["solar_daily"] at a time, next to the other users' jobs. on_progress(done, total) is called as slices finish. If
+    a slice fails, the others still run to the end and a RuntimeError is raised
+    without aggregating. With cleanup, the temporary slice mapsets are removed
+    once no job uses them any more. Returns the id of the aggregate job.
+    """
+    scheduler = scheduler or job_scheduler
+    slices = jobs["slices"]
+    required = {jobs["aggregate"]["mapset"], jobs["elevation"].split("@", 1)[1]}
+    owned = await asyncio.to_thread(_owned_mapsets, scheduler.session_factory, user_id, location, sorted(required))
+    if set(owned) != required:
+        raise PermissionError(f"Mapsets not found among the user's uploads: {', '.join(sorted(required - set(owned)))}")
+    if not await validate_actinia_user(username, actinia_password):
+        raise PermissionError("Invalid Actinia credentials")
+    credentials = {"actinia_user": username, "actinia_password": seal_secret(actinia_password)}
+    settled = False
+    for job in slices + [jobs["aggregate"]]:
+        await create_location_and_mapset(location, job["mapset"], epsg)
+
+    try:
+        slice_ids = await _enqueue_jobs(scheduler, location, slices, user_id, credentials, job_name, priority)
+        on_done = (lambda done: on_progress(done, len(slices))) if on_progress is not None else None
+        statuses = await _wait_for_jobs(scheduler, slice_ids, min_interval, max_interval, on_done)
+        failed = [(job_id, status, message) for job_id, (status, message) in statuses.items() if status != "finished"]
+        if failed:
+            settled = True
+            job_id, status, message = failed[0]
+            raise RuntimeError(f"{len(failed)} of {len(slices)} solar slices failed: job {job_id} {status}: {message}")
+
+        aggregate_ids = await _enqueue_jobs(scheduler, location, [jobs["aggregate"]], user_id, credentials, job_name, priority)
+        status, message = (await _wait_for_jobs(scheduler, aggregate_ids, min_interval, max_interval))[aggregate_ids[0]]
+        settled = True
+        if status != "finished":
+            raise RuntimeError(f"Solar aggregate job {aggregate_ids[0]} {status}: {message}")
+        print(f"[Solar] {len(slices)} slices aggregated in {location}/{jobs['aggregate']['mapset']}")
+        return aggregate_ids[0]
+    finally:
+        # a mapset cannot be removed while a job uses it
+        if cleanup and settled:
+            await _remove_mapsets(location, [job["mapset"] for job in slices])
@@ -1,13 +1,9 @@
-import requests
-from requests.auth import HTTPBasicAuth
-from app.config import settings
+import httpx
+from app.services.actinia.client import get_actinia_client
 
-def fetch_user_info(username: str):
+async def fetch_user_info(username: str):
     try:
-        response = requests.get(
-            f"{settings.ACTINIA_URL}/api/v3/users/{username}",
-            auth=HTTPBasicAuth(settings.ACTINIA_USER, settings.ACTINIA_PASSWORD)
-        )
+        response = await get_actinia_client().get(f"/users/{username}")
 
         if response.status_code == 200:
             return response.json()
@@ -15,7 +11,6 @@ def fetch_user_info(username: str):
             print(f"[Sync Error] Failed to fetch user data for '{username}' from Actinia.")
             print(f"[Status] {response.status_code} - {response.text}")
             return None
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"[Exception] {e}")
         return None
-
@@ -1,5 +1,6 @@
+import hashlib
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from jose import JWTError, jwe, jwt
 from app.config import settings
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -80,3 +81,13 @@ def refresh_token(token: str) -> str | None:
     if payload is None:
         return None
     return create_access_token(data=payload, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+
+# Encrypted secrets, e.g. a user's Actinia password kept with a queued job
+def _secret_key() -> bytes:
+    return hashlib.sha256(f"secret:{settings.SECRET_KEY}".encode()).digest()
+
+def seal_secret(value: str) -> str:
+    return jwe.encrypt(value.encode(), _secret_key(), algorithm="dir", encryption="A256GCM").decode()
+
+def open_secret(token: str) -> str:
+    return jwe.decrypt(token, _secret_key()).decode()
@@ -1,15 +1,16 @@
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.services.actinia.user_fetch import fetch_user_info
 from datetime import datetime
 
 
-def sync_user_profile(db: Session, username: str) -> User:
+async def sync_user_profile(db: Session, username: str) -> User:
     """
     Sync user profile from Actinia to local PostgreSQL DB.
     Creates the user if not found. Updates role if user exists.
     """
-    user_info = fetch_user_info(username)
+    user_info = await fetch_user_info(username)
 
     if not user_info:
         print(f"[Sync Error] Failed to fetch user data for '{username}' from Actinia.")
@@ -23,6 +24,13 @@ def sync_user_profile(db: Session, username: str) -> User:
         print(f"[Sync Error] Missing expected keys in Actinia response: {user_info}")
         return None
 
+    return await run_in_threadpool(_store_user_profile, db, actinia_username, actinia_role)
+
+
+def _store_user_profile(db: Session, actinia_username: str, actinia_role: str) -> User:
+    """
+    The blocking database half of sync_user_profile.
+    """
     user = db.query(User).filter(User.username == actinia_username).first()
 
     if user:
@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.file import File
+from app.services.actinia.buffer_cache import hash_file
+from app.utils.geospatial import convert_pool, convert_to_cog, is_cog, raster_metadata
+
+# File columns filled by raster_metadata
+RASTER_METADATA_FIELDS = (
+    "min_x", "min_y", "max_x", "max_y", "resolution_x", "resolution_y",
+    "width", "height", "data_type", "nodata", "band_stats",
+)
+
+
+def copy_raster_metadata(source: File, target: File):
+    """
+    Give target the stored raster metadata of source, e.g. for a deduplicated upload.
+    """
+    target.is_cog = source.is_cog
+    for field in RASTER_METADATA_FIELDS:
+        setattr(target, field, getattr(source, field))
+
+
+def _process_raster_upload(file_id: int, convert: bool):
+    with SessionLocal() as db:
+        record = db.get(File, file_id)
+        if record is None or not record.storage_path:
+            return
+
+        try:
+            if convert and not is_cog(record.storage_path):
+                path = convert_to_cog(record.storage_path)
+                record.storage_path = path
+                record.file_name = os.path.basename(path)
+                record.format = "tif"
+                # upload_hash and upload_format keep describing the upload, for deduplication
+                record.content_hash = hash_file(path).hexdigest()
+            record.is_cog = is_cog(record.storage_path)
+            metadata = raster_metadata(record.storage_path)
+        except Exception as e:
+            print(f"[Upload] file {file_id}: raster processing failed: {e!r}")
+            return
+
+        for field, value in metadata.items():
+            setattr(record, field, value)
+        db.commit()
+        print(f"[Upload] file {file_id}: raster metadata stored (COG: {record.is_cog})")
+
+
+async def process_raster_upload(file_id: int, convert: bool | None = None):
+    """
+    Post-upload stage of a raster: convert it to a COG when UPLOAD_COG_ENABLED
+    (or convert) is set, then store its metadata on the File record.
+
+    Runs in the bounded conversion pool, after the upload response was sent.
+    """
+    convert = settings.UPLOAD_COG_ENABLED if convert is None else convert
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(convert_pool, _process_raster_upload, file_id, convert)
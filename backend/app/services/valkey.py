@@ -0,0 +1,33 @@
+from app.config import settings
+
+try:
+    # redis-py speaks the Valkey protocol; it is optional, features fall back to memory without it
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+_valkey = None
+
+
+def get_valkey():
+    """
+    The shared async Valkey connection pool, or None when VALKEY_ENABLED is off or redis-py is missing.
+    """
+    global _valkey
+    if not settings.VALKEY_ENABLED or redis_asyncio is None:
+        return None
+    if _valkey is None:
+        _valkey = redis_asyncio.Redis(
+            host=settings.VALKEY_HOST,
+            port=settings.VALKEY_PORT,
+            password=settings.VALKEY_PASSWORD or None,
+            decode_responses=True,
+        )
+    return _valkey
+
+
+async def close_valkey():
+    global _valkey
+    if _valkey is not None:
+        await _valkey.aclose()
+        _valkey = None
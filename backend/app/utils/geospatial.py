@@ -1,13 +1,49 @@
+import asyncio
 import os
-import requests
-from osgeo import gdal, osr
+from concurrent.futures import ThreadPoolExecutor
+from osgeo import gdal, ogr, osr
 from fastapi import HTTPException
+from app.config import settings
+from app.services.actinia.client import get_actinia_client
+from app.services.actinia.provisioning import get_provisioning_cache
 
-ACTINIA_URL = "http://localhost:8088/api/v3"
-AUTH = ("actinia-gdi", "actinia-gdi")
+# GDAL/OGR probes of concurrent uploads share these threads instead of the event loop
+_probe_pool = ThreadPoolExecutor(max_workers=settings.UPLOAD_PROBE_WORKERS, thread_name_prefix="gdal-probe")
+# Post-upload raster conversions, kept apart so they never hold up the probes
+convert_pool = ThreadPoolExecutor(max_workers=settings.UPLOAD_COG_WORKERS, thread_name_prefix="gdal-cog")
 
-def get_epsg_from_raster(file_path: str) -> int:
-    dataset = gdal.Open(file_path)
+# Tiled, compressed, with overviews; PREDICTOR suits continuous rasters such as DSMs
+COG_OPTIONS = [
+    "COMPRESS=DEFLATE",
+    "PREDICTOR=YES",
+    "BLOCKSIZE=512",
+    "OVERVIEWS=AUTO",
+    "RESAMPLING=AVERAGE",
+    "BIGTIFF=IF_SAFER",
+    "NUM_THREADS=ALL_CPUS",
+]
+
+RASTER_EXT = ["tif", "tiff", "asc"]
+VECTOR_EXT = ["geojson", "gpkg", "shp", "zip"]
+
+
+def _srs_epsg(srs) -> int:
+    if not (srs.IsProjected() or srs.IsGeographic()):
+        raise ValueError("SRS is neither projected nor geographic — no EPSG found")
+    epsg = srs.GetAttrValue("AUTHORITY", 1)
+    if not epsg and srs.AutoIdentifyEPSG() == 0:
+        # e.g. the ESRI WKT of a .prj, which carries no authority
+        epsg = srs.GetAuthorityCode(None)
+    if not epsg:
+        raise ValueError("No EPSG authority code found")
+    return int(epsg)
+
+
+def probe_raster(file_path: str) -> dict:
+    """
+    CRS and size of a raster; GDAL only reads its header.
+    """
+    dataset = gdal.OpenEx(file_path, gdal.OF_RASTER | gdal.OF_READONLY)
     if not dataset:
         raise ValueError("Failed to open raster file with GDAL")
 
@@ -15,20 +51,21 @@ def get_epsg_from_raster(file_path: str) -> int:
     if not proj:
         raise ValueError("No projection found in raster file")
 
-    srs = osr.SpatialReference(wkt=proj)
-    if srs.IsProjected() or srs.IsGeographic():
-        epsg = srs.GetAttrValue("AUTHORITY", 1)
-        if epsg:
-            return int(epsg)
-        else:
-            raise ValueError("AUTHORITY (EPSG) not found in SRS")
-    else:
-        raise ValueError("SRS is neither projected nor geographic — no EPSG found")
+    return {
+        "kind": "raster",
+        "driver": dataset.GetDriver().ShortName,
+        "width": dataset.RasterXSize,
+        "height": dataset.RasterYSize,
+        "bands": dataset.RasterCount,
+        "epsg": _srs_epsg(osr.SpatialReference(wkt=proj)),
+    }
 
-from osgeo import ogr
 
-def get_epsg_from_vector(file_path: str) -> int:
-    ds = ogr.Open(file_path)
+def probe_vector(file_path: str) -> dict:
+    """
+    CRS and first layer of a vector file. The feature count is only given when the driver knows it without a scan.
+    """
+    ds = gdal.OpenEx(file_path, gdal.OF_VECTOR | gdal.OF_READONLY)
     if not ds:
         raise ValueError("Failed to open vector file with OGR")
 
@@ -40,34 +77,190 @@ def get_epsg_from_vector(file_path: str) -> int:
     if not sr:
         raise ValueError("No spatial reference found")
 
-    epsg = sr.GetAttrValue("AUTHORITY", 1)
-    if epsg:
-        return int(epsg)
-    else:
-        raise ValueError("No EPSG authority code found")
+    feature_count = layer.GetFeatureCount(force=0)
+    return {
+        "kind": "vector",
+        "driver": ds.GetDriver().ShortName,
+        "layers": ds.GetLayerCount(),
+        "layer": layer.GetName(),
+        "geometry_type": ogr.GeometryTypeToName(layer.GetGeomType()),
+        "feature_count": feature_count if feature_count >= 0 else None,
+        "epsg": _srs_epsg(sr),
+    }
+
+
+def _zip_shapefile(zip_path: str) -> str:
+    """
+    /vsizip/ path of the shapefile inside a ZIP, read in place without extracting the archive.
+    """
+    archive = f"/vsizip/{os.path.abspath(zip_path)}"
+    names = gdal.ReadDirRecursive(archive)
+    if names is None:
+        raise ValueError("Uploaded ZIP is not a valid archive")
+    for name in names:
+        if name.lower().endswith(".shp"):
+            return f"{archive}/{name}"
+    raise ValueError("No .shp file found in ZIP archive")
+
+
+def probe_file(file_path: str, ext: str) -> dict:
+    """
+    Metadata of an uploaded file by extension; raises ValueError when GDAL/OGR cannot read its CRS.
+    """
+    if ext in RASTER_EXT:
+        return probe_raster(file_path)
+    if ext == "zip":
+        return probe_vector(_zip_shapefile(file_path))
+    if ext in VECTOR_EXT:
+        return probe_vector(file_path)
+    raise ValueError(f"Unsupported file format: .{ext}")
+
+
+async def probe_upload(file_path: str, ext: str) -> dict:
+    """
+    probe_file in the bounded probe pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_probe_pool, probe_file, str(file_path), ext)
+
+
+def is_cog(file_path: str) -> bool:
+    dataset = gdal.OpenEx(file_path, gdal.OF_RASTER | gdal.OF_READONLY)
+    return bool(dataset) and dataset.GetMetadataItem("LAYOUT", "IMAGE_STRUCTURE") == "COG"
+
+
+def convert_to_cog(file_path: str) -> str:
+    """
+    Rewrite a raster as a Cloud Optimized GeoTIFF; returns its path, a .tif next to the input.
+
+    The COG is written to a temporary file and renamed over the target, never
+    written in place: uploads may be hard links shared with other users'
+    files. A non-GeoTIFF input (e.g. .asc) is removed once converted.
+    """
+    source = os.path.abspath(file_path)
+    stem, ext = os.path.splitext(source)
+    target = source if ext.lower() in (".tif", ".tiff") else f"{stem}.tif"
+    if target != source and os.path.exists(target):
+        target = f"{stem}_cog.tif"
 
-def create_location_and_mapset(location: str, mapset: str, epsg: int):
+    temp = f"{target}.cog.tmp"
+    try:
+        result = gdal.Translate(temp, source, format="COG", creationOptions=COG_OPTIONS)
+        if result is None:
+            raise ValueError(f"COG conversion failed: {gdal.GetLastErrorMsg()}")
+        result = None  # closes and flushes the file
+        os.replace(temp, target)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    if target != source:
+        os.remove(source)
+    return target
+
+
+def raster_metadata(file_path: str) -> dict:
+    """
+    Extent, resolution, size, data type, nodata and per band statistics of a raster.
+
+    Statistics are approximate: GDAL computes them from an overview when there is one.
+    """
+    dataset = gdal.OpenEx(file_path, gdal.OF_RASTER | gdal.OF_READONLY)
+    if not dataset:
+        raise ValueError("Failed to open raster file with GDAL")
+
+    x0, dx, rx, y0, ry, dy = dataset.GetGeoTransform()
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    corners = [(x0 + dx * col + rx * row, y0 + ry * col + dy * row) for col in (0, width) for row in (0, height)]
+    xs, ys = zip(*corners)
+
+    band_stats = []
+    for index in range(1, dataset.RasterCount + 1):
+        band = dataset.GetRasterBand(index)
+        try:
+            stats = band.ComputeStatistics(True)
+        except RuntimeError:
+            # e.g. a band of nodata only
+            stats = None
+        minimum, maximum, mean, std = stats if stats else (None, None, None, None)
+        band_stats.append({"band": index, "min": minimum, "max": maximum, "mean": mean, "std": std})
+
+    first = dataset.GetRasterBand(1)
+    return {
+        "min_x": min(xs),
+        "min_y": min(ys),
+        "max_x": max(xs),
+        "max_y": max(ys),
+        "resolution_x": abs(dx),
+        "resolution_y": abs(dy),
+        "width": width,
+        "height": height,
+        "data_type": gdal.GetDataTypeName(first.DataType),
+        "nodata": first.GetNoDataValue(),
+        "band_stats": band_stats,
+    }
+
+
+def get_epsg_from_raster(file_path: str) -> int:
+    return probe_raster(file_path)["epsg"]
+
+
+def get_epsg_from_vector(file_path: str) -> int:
+    return probe_vector(file_path)["epsg"]
+
+async def _ensure_location(client, cache, location: str, epsg: int):
     # Check existing locations
-    loc_resp = requests.get(f"{ACTINIA_URL}/locations", auth=AUTH)
+    loc_resp = await client.get("/locations")
     if loc_resp.status_code != 200:
         raise HTTPException(status_code=500, detail="Failed to fetch locations from Actinia")
 
     existing_locations = loc_resp.json().get("projects", [])
+    await cache.add_locations(existing_locations)
 
     # Create location if not exists
     if location not in existing_locations:
         payload = {"epsg": str(epsg)}
-        create_resp = requests.post(f"{ACTINIA_URL}/locations/{location}", json=payload, auth=AUTH)
+        create_resp = await client.post(f"/locations/{location}", json=payload)
         if create_resp.status_code != 200:
             raise HTTPException(status_code=500, detail=f"Failed to create location: {create_resp.text}")
+        await cache.add_locations([location])
+
 
-    # Check existing mapsets
-    mapset_resp = requests.get(f"{ACTINIA_URL}/locations/{location}/mapsets", auth=AUTH)
+async def _list_mapsets(client, location: str) -> list:
+    mapset_resp = await client.get(f"/locations/{location}/mapsets")
     stdout = mapset_resp.json().get("process_log", [])[0].get("stdout", "")
-    existing_mapsets = stdout.strip().split()
+    return stdout.strip().split()
+
+
+async def create_location_and_mapset(location: str, mapset: str, epsg: int):
+    """
+    Make sure the GRASS location and mapset exist in Actinia, creating them if needed.
+
+    Known locations and mapsets are cached (see ProvisioningCache), so an
+    existing mapset costs no Actinia call and a new mapset in a known location
+    a single one. Concurrent requests for the same location or mapset wait for
+    the first one instead of racing to create it.
+    """
+    cache = get_provisioning_cache()
+    if await cache.has_mapset(location, mapset):
+        return
+
+    client = get_actinia_client()
+
+    if not await cache.has_location(location):
+        async with cache.lock(location):
+            # another request may have created it while this one waited
+            if not await cache.has_location(location):
+                await _ensure_location(client, cache, location, epsg)
 
-    # Create mapset if not exists
-    if mapset not in existing_mapsets:
-        create_mapset_resp = requests.post(f"{ACTINIA_URL}/locations/{location}/mapsets/{mapset}", auth=AUTH)
+    async with cache.lock(f"{location}/{mapset}"):
+        if await cache.has_mapset(location, mapset):
+            return
+        # Create the mapset directly; listing is only needed to tell "already exists" from a failure
+        create_mapset_resp = await client.post(f"/locations/{location}/mapsets/{mapset}")
         if create_mapset_resp.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"Failed to create mapset: {create_mapset_resp.text}")
+            existing_mapsets = await _list_mapsets(client, location)
+            await cache.add_mapsets(location, existing_mapsets)
+            if mapset not in existing_mapsets:
+                raise HTTPException(status_code=500, detail=f"Failed to create mapset: {create_mapset_resp.text}")
+        await cache.add_mapsets(location, [mapset])
@@ -0,0 +1,112 @@
+"""
+An in-process stand-in for the Actinia API, for load tests.
+
+It answers the endpoints the backend calls, under /api/v3, after a
+configurable latency, and fails a configurable share of calls with a 503.
+Process chains "run" for job_duration seconds: their resource reports
+running, then finished.
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+from uuid import uuid4
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class FakeActinia:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        job_duration: float = 1.0,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.job_duration = job_duration
+        self.random = random.Random(seed)
+        self.locations = {}
+        self.resources = {}
+        self.calls = Counter()
+
+    async def respond(self, endpoint: str, body: dict, status_code: int = 200) -> JSONResponse:
+        self.calls[endpoint] += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.calls[f"{endpoint} 503"] += 1
+            return JSONResponse({"status": "error", "message": "Fake Actinia failure"}, status_code=503)
+        return JSONResponse(body, status_code=status_code)
+
+    def app(self) -> FastAPI:
+        router = APIRouter()
+
+        @router.get("/locations")
+        async def list_locations():
+            return await self.respond("GET /locations", {"status": "success", "projects": sorted(self.locations)})
+
+        @router.post("/locations/{location}")
+        async def create_location(location: str):
+            self.locations.setdefault(location, set())
+            return await self.respond("POST /locations/{location}", {"status": "success"})
+
+        @router.get("/locations/{location}/mapsets")
+        async def list_mapsets(location: str):
+            mapsets = " ".join(sorted(self.locations.get(location, ())))
+            return await self.respond(
+                "GET /locations/{location}/mapsets",
+                {"status": "finished", "process_log": [{"stdout": mapsets}]},
+            )
+
+        @router.post("/locations/{location}/mapsets/{mapset}")
+        async def create_mapset(location: str, mapset: str):
+            mapsets = self.locations.setdefault(location, set())
+            if mapset in mapsets:
+                return await self.respond("POST /locations/{location}/mapsets/{mapset}", {"status": "error"}, 400)
+            mapsets.add(mapset)
+            return await self.respond("POST /locations/{location}/mapsets/{mapset}", {"status": "success"})
+
+        @router.delete("/locations/{location}/mapsets/{mapset}")
+        async def delete_mapset(location: str, mapset: str):
+            self.locations.get(location, set()).discard(mapset)
+            return await self.respond("DELETE /locations/{location}/mapsets/{mapset}", {"status": "success"})
+
+        @router.get("/users/{user_id}")
+        async def get_user(user_id: str):
+            return await self.respond("GET /users/{user_id}", {"status": "success", "user_id": user_id, "user_role": "user"})
+
+        @router.post("/locations/{location}/mapsets/{mapset}/processing_async")
+        async def submit(location: str, mapset: str, request: Request):
+            resource_id = f"resource_id-{uuid4()}"
+            self.resources[resource_id] = time.monotonic()
+            url = str(request.base_url).rstrip("/") + f"/api/v3/resources/fake/{resource_id}"
+            return await self.respond(
+                "POST processing_async",
+                {"status": "accepted", "resource_id": resource_id, "urls": {"status": url}},
+            )
+
+        @router.get("/resources/{user_id}/{resource_id}")
+        async def resource(user_id: str, resource_id: str, request: Request):
+            started = self.resources.get(resource_id)
+            if started is None:
+                return await self.respond("GET /resources", {"status": "error", "message": "Resource not found"}, 404)
+            elapsed = time.monotonic() - started
+            if elapsed >= self.job_duration:
+                body = {
+                    "status": "finished",
+                    "progress": {"step": 1, "num_of_steps": 1},
+                    "urls": {"resources": [f"{request.base_url}api/v3/resources/{user_id}/{resource_id}/output.tif"]},
+                }
+            else:
+                body = {"status": "running", "progress": {"step": int(elapsed * 10), "num_of_steps": max(1, int(self.job_duration * 10))}}
+            return await self.respond("GET /resources", body)
+
+        app = FastAPI(title="Fake Actinia")
+        app.include_router(router, prefix="/api/v3")
+        return app
@@ -0,0 +1,331 @@
+"""
+Load tests of the API against an in-process fake Actinia.
+
+Run from the backend directory:
+
+    python -m benchmarks.load --concurrency 1 10 50 --save-baseline
+    python -m benchmarks.load --concurrency 1 10 50 --latency 0.05 --error-rate 0.01
+
+Every scenario (login, profile, upload, jobs) sends --requests requests at
+each concurrency level and reports the throughput and the latency
+percentiles. The API runs in this process behind httpx's ASGI transport, on
+a throwaway SQLite database unless --database-url is given; Actinia is
+replaced by benchmarks.fake_actinia with the given latency and error rate.
+With a stored baseline, the run exits with status 1 when a scenario lost
+throughput, or got a slower p95, by more than the threshold.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from benchmarks.fake_actinia import FakeActinia
+
+DEFAULT_SCENARIOS = ["login", "profile", "upload", "jobs"]
+DEFAULT_CONCURRENCY = [1, 10, 50]
+DEFAULT_BASELINE = Path(__file__).parent / "load_baseline.json"
+DEFAULT_THRESHOLD = 0.25
+
+# A tiny vector upload; GeoJSON is EPSG:4326
+UPLOAD_GEOJSON = json.dumps({
+    "type": "FeatureCollection",
+    "features": [{
+        "type": "Feature",
+        "properties": {"height": 10.0},
+        "geometry": {"type": "Polygon", "coordinates": [[[7.0, 50.0], [7.001, 50.0], [7.001, 50.001], [7.0, 50.0]]]},
+    }],
+}).encode()
+
+# Settings the app requires; the fake Actinia and the database replace the real services
+BENCH_ENVIRONMENT = {
+    "ACTINIA_URL": "http://fake-actinia",
+    "ACTINIA_USER": "bench",
+    "ACTINIA_PASSWORD": "bench",
+    "SECRET_KEY": "load-test-secret",
+    "POSTGRES_HOST": "unused",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_USER": "unused",
+    "POSTGRES_PASSWORD": "unused",
+    "POSTGRES_DB": "unused",
+    "VALKEY_HOST": "unused",
+    "VALKEY_PORT": "6379",
+    "VALKEY_PASSWORD": "unused",
+    "DEBUG": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    # nearest rank
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def _seed_users(usernames: list[str]):
+    from app.database import SessionLocal
+    from app.models import User
+
+    with SessionLocal() as db:
+        db.add_all([User(username=username, role="user") for username in usernames])
+        db.commit()
+
+
+def _seed_mapset(usernames: list[str], location: str, mapset: str):
+    """
+    Give the users an upload in location/mapset, so they may run jobs there.
+    """
+    from app.database import SessionLocal
+    from app.models import User
+    from app.models.file import File
+
+    with SessionLocal() as db:
+        users = db.query(User).filter(User.username.in_(usernames)).all()
+        db.add_all([File(user_id=user.id, file_name="seed.geojson", location=location, mapset=mapset) for user in users])
+        db.commit()
+
+
+async def _login(client, username: str):
+    return await client.post("/auth/login", data={"username": username, "password": "bench"})
+
+
+async def _tokens(client, prefix: str, count: int) -> list[str]:
+    """
+    One logged-in user per concurrent client: a user logging in twice in the same second gets the same token.
+    """
+    usernames = [f"{prefix}_{i}" for i in range(count)]
+    _seed_users(usernames)
+    tokens = []
+    for username in usernames:
+        response = await _login(client, username)
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def _scenario(name: str, client, prefix: str, requests: int, concurrency: int):
+    """
+    Prepare a scenario; returns call(i) sending its i-th request.
+    """
+    if name == "login":
+        usernames = [f"{prefix}_{i}" for i in range(requests)]
+        _seed_users(usernames)
+        return lambda i: _login(client, usernames[i])
+
+    tokens = await _tokens(client, prefix, concurrency)
+
+    if name == "profile":
+        return lambda i: client.get("/profile/me", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+
+    if name == "upload":
+        return lambda i: client.post(
+            "/upload/upload",
+            params={"token": tokens[i % len(tokens)]},
+            files={"file": (f"load_{uuid4().hex}.geojson", UPLOAD_GEOJSON, "application/geo+json")},
+        )
+
+    if name == "jobs":
+        chain = {"version": "1", "list": [{"id": "noop", "module": "g.region", "flags": "p"}]}
+        _seed_mapset([f"{prefix}_{i}" for i in range(concurrency)], "location_epsg_4326", "PERMANENT")
+        return lambda i: client.post("/jobs/", params={"token": tokens[i % len(tokens)]}, json={
+            "job_name": f"load_{i}",
+            "job_type": "export",
+            "location": "location_epsg_4326",
+            "mapset": "PERMANENT",
+            "process_chain": chain,
+            "actinia_password": "bench",
+        })
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+async def _drive(call, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                response = await call(i)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def _upload_root() -> Path:
+    from app.api.upload import routes
+
+    # where the upload route stores files, see upload_file
+    return Path(routes.__file__).resolve().parents[3] / "data" / "actinia-data" / "userdata"
+
+
+async def run_load(scenarios, concurrency_levels, requests: int, fake: FakeActinia) -> dict:
+    import httpx
+    from sqlmodel import SQLModel
+
+    from app.config import settings
+    from app.database import engine
+    from app.main import app
+    from app.services.actinia.client import ActiniaClient, close_actinia_client, set_actinia_client
+    from app.services.actinia.job_poller import job_poller
+    from app.services.actinia.scheduler import job_scheduler
+
+    # the SQL echo would dominate the timings
+    engine.echo = False
+    SQLModel.metadata.create_all(engine)
+
+    set_actinia_client(ActiniaClient(
+        settings.ACTINIA_URL,
+        auth=(settings.ACTINIA_USER, settings.ACTINIA_PASSWORD),
+        timeout=settings.ACTINIA_TIMEOUT,
+        max_connections=settings.ACTINIA_MAX_CONNECTIONS,
+        max_concurrency=settings.ACTINIA_MAX_CONCURRENCY,
+        retries=settings.ACTINIA_RETRIES,
+        transport=httpx.ASGITransport(app=fake.app()),
+    ))
+    # the ASGI transport does not run the app's startup events
+    if "jobs" in scenarios:
+        job_poller.start()
+        job_scheduler.start()
+
+    run_id = uuid4().hex[:8]
+    results = {}
+    upload_users = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api", timeout=300) as client:
+            for name in scenarios:
+                for concurrency in concurrency_levels:
+                    prefix = f"load_{run_id}_{name}_{concurrency}"
+                    # the routes print per request; keep the report readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        call = await _scenario(name, client, prefix, requests, concurrency)
+                        result = await _drive(call, requests, concurrency)
+                    if name == "upload":
+                        upload_users += [f"{prefix}_{i}" for i in range(concurrency)]
+                    results[f"{name}@{concurrency}"] = result
+                    print(
+                        f"{name:>8} c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s  "
+                        f"p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                        f"p99 {result['p99_ms']:>8.1f} ms  errors {result['errors']}"
+                    )
+    finally:
+        await job_scheduler.stop()
+        await job_poller.stop()
+        await close_actinia_client()
+        for username in upload_users:
+            shutil.rmtree(_upload_root() / username, ignore_errors=True)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "requests": requests,
+            "latency": fake.latency,
+            "jitter": fake.jitter,
+            "error_rate": fake.error_rate,
+            "actinia_calls": dict(fake.calls),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Regressions of current against baseline, as printable lines; only shared keys are compared.
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+        if result["throughput_rps"] < reference["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{key} throughput: {result['throughput_rps']} req/s vs baseline {reference['throughput_rps']} req/s"
+            )
+        if result["p95_ms"] > reference["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key} p95: {result['p95_ms']} ms vs baseline {reference['p95_ms']} ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scenarios", nargs="+", choices=DEFAULT_SCENARIOS, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Actinia latency, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra fake Actinia latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake Actinia calls failing with a 503")
+    parser.add_argument("--job-duration", type=float, default=1.0, help="seconds a fake Actinia job runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="database to run against; a temporary SQLite file by default")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed throughput loss and p95 growth, as a fraction")
+    parser.add_argument("--output", type=Path, help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    fake = FakeActinia(args.latency, args.jitter, args.error_rate, args.job_duration, args.seed)
+    with tempfile.TemporaryDirectory(prefix="load-bench-") as workdir:
+        # set before app.config is imported; the database never comes from .env
+        for key, value in BENCH_ENVIRONMENT.items():
+            os.environ.setdefault(key, value)
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/load.db"
+        current = asyncio.run(run_load(args.scenarios, args.concurrency, args.requests, fake))
+
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["meta"].get("node") != current["meta"]["node"]:
+        print(f"Warning: baseline recorded on {baseline['meta'].get('node')}, timings may not be comparable")
+
+    regressions = compare(current, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regression against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Benchmarks of the buffer and DSM preprocessing hot paths, on synthetic buildings.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --sizes 1000 10000 --save-baseline
+    python -m benchmarks.run --sizes 1000 10000 --threshold 0.25
+
+Every (stage, size) pair is measured in a fresh process, which reports the
+best wall time over --repeat runs and its peak resident memory. With a stored
+baseline, the run exits with status 1 when a stage got slower, or used more
+memory, than the baseline by more than the threshold. Neither Actinia nor the
+database is needed.
+"""
+import argparse
+import json
+import math
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from benchmarks.synthetic import make_buildings, write_buildings
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def _stage_load(workdir: Path, size: int):
+    from app.services.actinia.buffer_generator import load_and_standardize_buildings
+
+    path = workdir / f"buildings_{size}.gpkg"
+    return lambda: load_and_standardize_buildings(str(path))
+
+
+def _stage_load_reproject(workdir: Path, size: int):
+    from app.services.actinia.buffer_generator import load_and_standardize_buildings
+
+    path = workdir / f"buildings_{size}_4326.gpkg"
+    return lambda: load_and_standardize_buildings(str(path))
+
+
+def _stage_buffers_loop(workdir: Path, size: int):
+    from app.services.actinia.buffer_generator import generate_inward_buffers, load_and_standardize_buildings
+
+    gdf = load_and_standardize_buildings(str(workdir / f"buildings_{size}.gpkg"))
+    rows = list(zip(gdf.geometry.values, gdf["height"], gdf["slope"]))
+    return lambda: [generate_inward_buffers(geometry, height, slope) for geometry, height, slope in rows]
+
+
+def _stage_buffers_batch(workdir: Path, size: int):
+    from app.services.actinia.buffer_generator import generate_inward_buffers_batch, load_and_standardize_buildings
+
+    gdf = load_and_standardize_buildings(str(workdir / f"buildings_{size}.gpkg"))
+    return lambda: generate_inward_buffers_batch(gdf.geometry.values, gdf["height"].values, gdf["slope"].values)
+
+
+def _process_stage(output_format: str):
+    def stage(workdir: Path, size: int):
+        from app.services.actinia.buffer_generator import process_buildings_with_buffers
+
+        path = workdir / f"buildings_{size}.gpkg"
+        return lambda: process_buildings_with_buffers(
+            str(path), workdir, "bench", "location", f"{output_format}_{size}", output_format=output_format
+        )
+    return stage
+
+
+def _stage_dsm(workdir: Path, size: int):
+    import geopandas as gpd
+    from app.services.actinia.buffer_generator import process_buildings_with_buffers
+    from app.services.actinia.dsm_rasterizer import rasterize_buffers_to_dsm
+
+    buffers = process_buildings_with_buffers(
+        str(workdir / f"buildings_{size}.gpkg"), workdir, "bench", "location", f"dsm_{size}", output_format="gpkg"
+    )
+    rings = gpd.read_file(buffers, columns=["height"])
+    return lambda: rasterize_buffers_to_dsm(rings, workdir / f"dsm_{size}.tif")
+
+
+# name -> setup(workdir, size) returning the function to time; setup is not timed
+STAGES = {
+    "load": _stage_load,
+    "load_reproject": _stage_load_reproject,
+    "buffers_loop": _stage_buffers_loop,
+    "buffers_batch": _stage_buffers_batch,
+    "process_geojson": _process_stage("geojson"),
+    "process_gpkg": _process_stage("gpkg"),
+    "dsm": _stage_dsm,
+}
+
+
+def _measure(stage: str, workdir: str, size: int, repeat: int) -> dict:
+    """
+    Runs in a fresh process: set up the stage, then time it `repeat` times.
+    """
+    import contextlib
+    import io
+
+    # the pipeline prints per output file; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = STAGES[stage](Path(workdir), size)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    return {"seconds": round(min(times), 4), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def prepare_inputs(workdir: Path, sizes, seed: int):
+    for size in sizes:
+        gdf = make_buildings(size, seed=seed)
+        write_buildings(gdf, workdir / f"buildings_{size}.gpkg")
+        write_buildings(gdf.to_crs(epsg=4326), workdir / f"buildings_{size}_4326.gpkg")
+
+
+def run_benchmarks(stages, sizes, repeat=3, seed=0) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="buffer-bench-") as workdir:
+        print(f"Generating synthetic buildings: {', '.join(str(size) for size in sizes)}")
+        prepare_inputs(Path(workdir), sizes, seed)
+
+        for size in sizes:
+            for stage in stages:
+                # a new process per measurement keeps peak memory per stage
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    result = executor.submit(_measure, stage, workdir, size, repeat).result()
+                results[f"{stage}@{size}"] = result
+                print(f"{stage:>16} {size:>8}  {result['seconds']:>9.3f}s  {result['peak_rss_mb']:>8.1f} MB")
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, memory_threshold: float) -> list[str]:
+    """
+    Regressions of current against baseline, as printable lines; only shared keys are compared.
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+        checks = [("seconds", threshold, "s"), ("peak_rss_mb", memory_threshold, " MB")]
+        for metric, limit, unit in checks:
+            ratio = result[metric] / reference[metric] if reference[metric] else math.inf
+            if ratio > 1 + limit:
+                regressions.append(
+                    f"{key} {metric}: {result[metric]}{unit} vs baseline {reference[metric]}{unit} (+{(ratio - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, as a fraction")
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed peak memory growth, as a fraction")
+    parser.add_argument("--output", type=Path, help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.stages, args.sizes, args.repeat, args.seed)
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["meta"].get("node") != current["meta"]["node"]:
+        print(f"Warning: baseline recorded on {baseline['meta'].get('node')}, timings may not be comparable")
+
+    regressions = compare(current, baseline, args.threshold, args.memory_threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regression against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Mean distance between neighbouring buildings, so the area grows with the count
+BUILDING_SPACING = 40.0
+# Origin of the synthetic city, inside UTM 32N
+ORIGIN = (400_000.0, 5_000_000.0)
+
+
+def _star_polygons(rng, centers, vertices, radius):
+    """
+    Star shaped polygons with a random number of vertices in the given range.
+    """
+    polygons = []
+    for (x, y), k in zip(centers, rng.integers(vertices[0], vertices[1] + 1, len(centers))):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, k))
+        radii = rng.uniform(radius[0], radius[1], k)
+        polygons.append(shapely.Polygon(np.c_[x + radii * np.cos(angles), y + radii * np.sin(angles)]))
+    return shapely.make_valid(np.array(polygons, dtype=object))
+
+
+def _rectangles(rng, centers, size):
+    """
+    Rectangles rotated by a random angle around their center.
+    """
+    width = rng.uniform(size[0], size[1], len(centers))
+    depth = rng.uniform(size[0], size[1], len(centers))
+    angle = rng.uniform(0, np.pi / 2, len(centers))
+    # corners of the unrotated rectangle, relative to its center: (n, 4, 2)
+    corners = np.stack([
+        np.c_[-width, -depth], np.c_[width, -depth], np.c_[width, depth], np.c_[-width, depth]
+    ], axis=1) / 2
+    cos, sin = np.cos(angle)[:, None], np.sin(angle)[:, None]
+    x = centers[:, :1] + corners[..., 0] * cos - corners[..., 1] * sin
+    y = centers[:, 1:] + corners[..., 0] * sin + corners[..., 1] * cos
+    return shapely.polygons(np.stack([x, y], axis=-1))
+
+
+def _courtyards(rng, centers, size):
+    """
+    Square blocks with an inner courtyard: rings split into several parts.
+    """
+    outer = rng.uniform(size[0], size[1], len(centers))
+    blocks = shapely.box(centers[:, 0], centers[:, 1], centers[:, 0] + outer, centers[:, 1] + outer)
+    yards = shapely.box(
+        centers[:, 0] + outer * 0.3, centers[:, 1] + outer * 0.3,
+        centers[:, 0] + outer * 0.7, centers[:, 1] + outer * 0.7,
+    )
+    return shapely.difference(blocks, yards)
+
+
+def make_buildings(
+    count: int,
+    seed: int = 0,
+    vertices=(5, 14),
+    size=(6.0, 40.0),
+    heights=(3.0, 40.0),
+    slopes=(0.0, 45.0),
+    mix=(0.5, 0.35, 0.15),
+    epsg: int = 32632
+) -> gpd.GeoDataFrame:
+    """
+    Synthetic building footprints with height and slope attributes.
+
+    mix is the share of star shaped polygons (vertex count in `vertices`),
+    rotated rectangles and courtyard blocks; size bounds their extent in meters.
+    The same arguments always give the same layer.
+    """
+    rng = np.random.default_rng(seed)
+    side = np.sqrt(count) * BUILDING_SPACING
+    centers = np.c_[rng.uniform(0, side, count) + ORIGIN[0], rng.uniform(0, side, count) + ORIGIN[1]]
+
+    kinds = rng.choice(3, count, p=np.asarray(mix) / np.sum(mix))
+    geometries = np.empty(count, dtype=object)
+    star, rectangle, courtyard = (kinds == 0), (kinds == 1), (kinds == 2)
+    geometries[star] = _star_polygons(rng, centers[star], vertices, (size[0] / 2, size[1] / 2))
+    geometries[rectangle] = _rectangles(rng, centers[rectangle], size)
+    geometries[courtyard] = _courtyards(rng, centers[courtyard], (max(size[0], 12.0), size[1] * 1.5))
+
+    gdf = gpd.GeoDataFrame(
+        {
+            "height": rng.uniform(heights[0], heights[1], count),
+            "slope": rng.uniform(slopes[0], slopes[1], count),
+        },
+        geometry=geometries,
+        crs=32632,
+    )
+    return gdf if epsg == 32632 else gdf.to_crs(epsg=epsg)
+
+
+def write_buildings(gdf: gpd.GeoDataFrame, path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    gdf.to_file(path, driver="GPKG", engine="pyogrio")
+    return path